@@ -0,0 +1,419 @@
+"""
+Timings for the encryption functions, phase by phase.
+
+Run with: python benchmark.py
+
+    --sizes 1,1000,1000000   message sizes (in characters) for encode/decode
+    --block-sizes 8,32,128   block sizes to time Cipher with
+    --repeat 5               how many times each timing is taken
+    --save baseline.json     write the results out as a baseline
+    --compare baseline.json  flag anything slower than the baseline
+    --threshold 0.10         how much slower counts as a regression (10%)
+
+Every result has latency percentiles, throughput in characters and blocks
+per second, and the peak memory (from tracemalloc) of one extra run.
+Comparing against a baseline exits with 1 if anything regressed.
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+import encode_v2
+from encode_v2 import (
+    ENGINES,
+    Cipher,
+    STRING_LENGTH,
+    binary_reduction,
+    decode,
+    encode,
+    get_password_binaries_array,
+    get_string_binary,
+    rebuild_binary,
+    set_base_hash_array,
+    set_decrypt,
+    set_encode,
+    set_hash_array,
+)
+
+# Password lengths to time the key schedule with
+PASSWORD_LENGTHS = (8, 16, 17, 32, 64)
+# Message sizes (in characters) to time encode() and decode() with
+MESSAGE_SIZES = (1, 32, 1024, 32768, 1048576)
+# Block sizes to time Cipher.encode() and Cipher.decode() with
+BLOCK_SIZES = (8, 16, 32, 64, 128)
+# Message size (in characters) used for the block size timings
+BLOCK_SIZE_MESSAGE = 32768
+# Password used for everything other than the key schedule timings
+PASSWORD = "benchmark-password"
+# Slowdown (as a fraction) that counts as a regression
+THRESHOLD = 0.10
+
+
+def get_password(length):
+    """
+    Returns a repeatable password array of the given length, using the
+    printable characters between chr(33) and chr(126).
+    """
+    return [chr(33 + (x * 7) % 94) for x in range(length)]
+
+
+def get_message(size, seed=0):
+    """
+    Returns a repeatable message of size characters, mostly printable text
+    with the odd NULL_STRING mixed in.
+    """
+    random_generator = random.Random(seed)
+    characters = [chr(x) for x in range(32, 127)] * 4 + ["\n", encode_v2.NULL_STRING]
+    return "".join(random_generator.choice(characters) for _ in range(size))[:size]
+
+
+def percentile(sorted_times, percent):
+    """
+    Returns the nearest-rank percentile of an already sorted list.
+    """
+    rank = max(int(round(percent / 100 * len(sorted_times))) - 1, 0)
+    return sorted_times[min(rank, len(sorted_times) - 1)]
+
+
+def measure(name, function, *args, repeat=5, characters=0, blocks=0, setup=None):
+    """
+    Times function(*args) repeat times (calling setup() before each one),
+    then runs it once more under tracemalloc for the peak memory.
+
+    Returns a dictionary of the results for that phase.
+    """
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - start)
+
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    function(*args)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    times.sort()
+    median = percentile(times, 50)
+    return {
+        "name": name,
+        "repeat": repeat,
+        "mean": sum(times) / len(times),
+        "p50": median,
+        "p90": percentile(times, 90),
+        "p99": percentile(times, 99),
+        "chars_per_s": characters / median if characters and median else None,
+        "blocks_per_s": blocks / median if blocks and median else None,
+        "peak_memory": peak_memory,
+    }
+
+
+def bench_hash_array(lengths=PASSWORD_LENGTHS, repeat=5):
+    """
+    Times set_hash_array() with every engine for each password length.
+
+    No permutations dictionary is passed, so the fast engine works out its
+    position shuffle on every call and the derivation is timed in full.
+    """
+    base_hash_array = set_base_hash_array()
+    results = []
+
+    for length in lengths:
+        password = get_password(length)
+        for engine in ENGINES:
+            results.append(
+                measure(
+                    f"set_hash_array[{engine}, password={length}]",
+                    set_hash_array,
+                    base_hash_array,
+                    password,
+                    engine,
+                    repeat=repeat,
+                )
+            )
+
+    return results
+
+
+def bench_encode_block(repeat=5):
+    """
+    Times a single block of binary_reduction() and set_encode() with every
+    engine.
+    """
+    password_array = set_hash_array(set_base_hash_array(), list(PASSWORD))[
+        :STRING_LENGTH
+    ]
+    string_array = list(get_message(STRING_LENGTH))
+    binary = get_string_binary(password_array + string_array)
+    results = [
+        measure(
+            "binary_reduction[one pass]",
+            binary_reduction,
+            binary,
+            repeat=repeat,
+            characters=STRING_LENGTH,
+            blocks=1,
+        )
+    ]
+
+    for engine in ENGINES:
+        results.append(
+            measure(
+                f"set_encode[{engine}]",
+                set_encode,
+                string_array,
+                password_array,
+                engine,
+                repeat=repeat,
+                characters=STRING_LENGTH,
+                blocks=1,
+            )
+        )
+
+    return results
+
+
+def bench_decode_block(repeat=5):
+    """
+    Times a single block of get_password_binaries_array(), rebuild_binary()
+    and set_decrypt() with every engine.
+    """
+    password_array = set_hash_array(set_base_hash_array(), list(PASSWORD))[
+        :STRING_LENGTH
+    ]
+    encrypted_array = list(set_encode(list(get_message(STRING_LENGTH)), password_array))
+    password_binary_tree = get_password_binaries_array(password_array)
+    string_binary = get_string_binary(encrypted_array)
+    results = [
+        measure(
+            "get_password_binaries_array",
+            get_password_binaries_array,
+            password_array,
+            repeat=repeat,
+            characters=STRING_LENGTH,
+            blocks=1,
+        ),
+        measure(
+            "rebuild_binary[one level]",
+            rebuild_binary,
+            string_binary,
+            password_binary_tree[-1],
+            repeat=repeat,
+            characters=STRING_LENGTH,
+            blocks=1,
+        ),
+    ]
+
+    for engine in ENGINES:
+        results.append(
+            measure(
+                f"set_decrypt[{engine}]",
+                set_decrypt,
+                encrypted_array,
+                password_array,
+                "",
+                engine,
+                repeat=repeat,
+                characters=STRING_LENGTH,
+                blocks=1,
+            )
+        )
+
+    return results
+
+
+def bench_end_to_end(sizes=MESSAGE_SIZES, repeat=5):
+    """
+    Times encode() and decode() over whole messages of each size.
+    """
+    results = []
+
+    for size in sizes:
+        message = get_message(size)
+        blocks = -(-size // STRING_LENGTH)
+        encrypted = encode(message, PASSWORD)
+        for name, function, text in (
+            ("encode", encode, message),
+            ("decode", decode, encrypted),
+        ):
+            results.append(
+                measure(
+                    f"{name}[{size} chars]",
+                    function,
+                    text,
+                    PASSWORD,
+                    repeat=repeat,
+                    characters=size,
+                    blocks=blocks,
+                )
+            )
+
+    return results
+
+
+def bench_block_sizes(block_sizes=BLOCK_SIZES, repeat=5):
+    """
+    Times Cipher.encode() and Cipher.decode() over the same message with each
+    block size, to show the trade between the reduction cost of a block and
+    the number of blocks.
+    """
+    message = get_message(BLOCK_SIZE_MESSAGE)
+    results = []
+
+    for block_size in block_sizes:
+        cipher = Cipher(PASSWORD, block_size)
+        blocks = -(-BLOCK_SIZE_MESSAGE // block_size)
+        encrypted = cipher.encode(message)
+        for name, function, text in (
+            ("encode", cipher.encode, message),
+            ("decode", cipher.decode, encrypted),
+        ):
+            results.append(
+                measure(
+                    f"Cipher.{name}[block_size={block_size}]",
+                    function,
+                    text,
+                    repeat=repeat,
+                    characters=BLOCK_SIZE_MESSAGE,
+                    blocks=blocks,
+                )
+            )
+
+    return results
+
+
+def run_suite(sizes=MESSAGE_SIZES, repeat=5, block_sizes=BLOCK_SIZES):
+    """
+    Runs every benchmark and returns the results keyed by name, along with
+    some details of where they were run.
+    """
+    results = (
+        bench_hash_array(repeat=repeat)
+        + bench_encode_block(repeat=repeat)
+        + bench_decode_block(repeat=repeat)
+        + bench_end_to_end(sizes, repeat=repeat)
+        + bench_block_sizes(block_sizes, repeat=repeat)
+    )
+
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "engine": encode_v2.ENGINE,
+        "results": {result["name"]: result for result in results},
+    }
+
+
+def compare(suite, baseline, threshold=THRESHOLD):
+    """
+    Compares the median times against a baseline suite. Returns a list of
+    (name, baseline p50, new p50, change) for everything that got slower than
+    the threshold allows.
+    """
+    regressions = []
+
+    for name, result in suite["results"].items():
+        old = baseline["results"].get(name)
+        if old is None or not old["p50"]:
+            continue
+        change = (result["p50"] - old["p50"]) / old["p50"]
+        if change > threshold:
+            regressions.append((name, old["p50"], result["p50"], change))
+
+    return regressions
+
+
+def format_rate(rate):
+    """
+    Formats a per second rate in a short form.
+    """
+    if rate is None:
+        return "-"
+    for limit, suffix in ((1e9, "G"), (1e6, "M"), (1e3, "k")):
+        if rate >= limit:
+            return f"{rate / limit:.1f}{suffix}"
+    return f"{rate:.1f}"
+
+
+def print_results(suite, baseline=None):
+    """
+    Prints the results as a table, with the change from the baseline if
+    there is one.
+    """
+    print(
+        f"{'benchmark':<40}{'p50':>11}{'p90':>11}{'p99':>11}"
+        f"{'chars/s':>10}{'blocks/s':>10}{'peak mem':>11}{'change':>9}"
+    )
+    for name, result in suite["results"].items():
+        change = ""
+        if baseline is not None and name in baseline["results"]:
+            old = baseline["results"][name]["p50"]
+            if old:
+                change = f"{100 * (result['p50'] - old) / old:+.0f}%"
+        print(
+            f"{name:<40}"
+            f"{result['p50'] * 1000:>9.3f}ms"
+            f"{result['p90'] * 1000:>9.3f}ms"
+            f"{result['p99'] * 1000:>9.3f}ms"
+            f"{format_rate(result['chars_per_s']):>10}"
+            f"{format_rate(result['blocks_per_s']):>10}"
+            f"{result['peak_memory'] / 1024:>9.1f}kB"
+            f"{change:>9}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        default=",".join(str(size) for size in MESSAGE_SIZES),
+        help="comma separated message sizes for encode/decode",
+    )
+    parser.add_argument(
+        "--block-sizes",
+        default=",".join(str(size) for size in BLOCK_SIZES),
+        help="comma separated block sizes for Cipher",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--engine", choices=ENGINES, default=encode_v2.ENGINE)
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="compare against this JSON baseline")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args(argv)
+
+    encode_v2.ENGINE = args.engine
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    block_sizes = [int(size) for size in args.block_sizes.split(",") if size]
+    suite = run_suite(sizes, repeat=args.repeat, block_sizes=block_sizes)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+    print_results(suite, baseline)
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(suite, file, indent=2)
+
+    if baseline is not None:
+        regressions = compare(suite, baseline, args.threshold)
+        for name, old, new, change in regressions:
+            print(
+                f"REGRESSION {name}: {old * 1000:.3f}ms -> {new * 1000:.3f}ms "
+                f"({100 * change:+.0f}%)"
+            )
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+asyncio versions of encode() and decode(), so an event loop is never held up
+by the encryption work.
+
+    from encode_async import encode_async, decode_async, encode_stream_async
+
+    encrypted = await encode_async("some text", "password")
+    await encode_stream_async(reader, writer, "password")
+
+Every call is run in an executor through an AsyncExecutor, which only lets
+max_concurrency of them run at once; the rest wait without blocking the loop.
+Passing a ProcessPoolExecutor to encode_async() and decode_async() also keeps
+the work off the event loop's GIL. The stream adapters read and write on the
+event loop and only hand each chunk's encoding to the executor, so idle
+streams never use up its slots. They need a thread pool (the default).
+"""
+
+import asyncio
+import codecs
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from encode_v2 import STREAM_CHUNK_SIZE, Decoder, Encoder, decode, encode
+
+# Number of calls allowed to run in the executor at once
+ASYNC_MAX_CONCURRENCY = 4
+
+
+class AsyncExecutor:
+    """
+    Runs functions in an executor (the event loop's default one if None),
+    with no more than max_concurrency of them running at the same time.
+    """
+
+    def __init__(self, executor=None, max_concurrency=ASYNC_MAX_CONCURRENCY):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.executor = executor
+        self.max_concurrency = max_concurrency
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run(self, function, *args, **kwargs):
+        """
+        Waits for a free slot, then runs function(*args, **kwargs) in the
+        executor and gives back its result.
+        """
+        async with self.semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self.executor, partial(function, *args, **kwargs)
+            )
+
+
+# Thread pool shared by the default AsyncExecutors
+DEFAULT_POOL = None
+# Default AsyncExecutor for each running event loop
+DEFAULT_EXECUTORS = weakref.WeakKeyDictionary()
+DEFAULT_EXECUTOR_LOCK = threading.Lock()
+
+
+def get_default_executor():
+    """
+    Returns the AsyncExecutor used when none is given. There is one for each
+    event loop (an asyncio.Semaphore can only be used by one loop), all
+    sharing one thread pool.
+    """
+    global DEFAULT_POOL
+
+    loop = asyncio.get_running_loop()
+    with DEFAULT_EXECUTOR_LOCK:
+        if DEFAULT_POOL is None:
+            DEFAULT_POOL = ThreadPoolExecutor(max_workers=ASYNC_MAX_CONCURRENCY)
+        executor = DEFAULT_EXECUTORS.get(loop)
+        if executor is None:
+            executor = DEFAULT_EXECUTORS[loop] = AsyncExecutor(DEFAULT_POOL)
+        return executor
+
+
+async def encode_async(string, password, executor=None):
+    """
+    Same as encode(), run through an AsyncExecutor (the shared one if None).
+    """
+    if executor is None:
+        executor = get_default_executor()
+    return await executor.run(encode, string, password)
+
+
+async def decode_async(string, password, executor=None):
+    """
+    Same as decode(), run through an AsyncExecutor (the shared one if None).
+    """
+    if executor is None:
+        executor = get_default_executor()
+    return await executor.run(decode, string, password)
+
+
+async def run_stream(coder, reader, writer, executor, chunk_size, encoding):
+    """
+    Feeds text from an asyncio.StreamReader through coder (an Encoder or a
+    Decoder) and writes what it gives back to an asyncio.StreamWriter.
+
+    Reading, writing and waiting for writer.drain() all happen on the event
+    loop; only coder.update() runs in the executor. So a stream only holds
+    one of the executor's slots while it has text to work on, never while it
+    waits on a slow or idle client, and a slow reader on the other end slows
+    the stream down instead of filling up memory.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    while True:
+        data = await reader.read(chunk_size)
+        chunk = decoder.decode(data, final=not data)
+
+        text = await executor.run(coder.update, chunk) if chunk else ""
+        if not data:
+            # Only the last (padded or trimmed) block is left
+            text += coder.finalize()
+        if text:
+            writer.write(text.encode(encoding))
+            await writer.drain()
+        if not data:
+            return
+
+
+async def encode_stream_async(
+    reader,
+    writer,
+    password,
+    executor=None,
+    chunk_size=STREAM_CHUNK_SIZE,
+    encoding="utf-8",
+):
+    """
+    Reads text from an asyncio.StreamReader until it runs out and writes the
+    encoded blocks to an asyncio.StreamWriter as they are finished (see
+    run_stream()). The writer is left open.
+
+    executor has to be an AsyncExecutor over a thread pool (the shared one if
+    None), since the Encoder is changed by each call.
+    """
+    if executor is None:
+        executor = get_default_executor()
+    await run_stream(Encoder(password), reader, writer, executor, chunk_size, encoding)
+
+
+async def decode_stream_async(
+    reader,
+    writer,
+    password,
+    executor=None,
+    chunk_size=STREAM_CHUNK_SIZE,
+    encoding="utf-8",
+):
+    """
+    Reads encoded text from an asyncio.StreamReader until it runs out and
+    writes the decoded text to an asyncio.StreamWriter as it is finished (see
+    run_stream()). The writer is left open.
+
+    executor has to be an AsyncExecutor over a thread pool (the shared one if
+    None), since the Decoder is changed by each call.
+    """
+    if executor is None:
+        executor = get_default_executor()
+    await run_stream(Decoder(password), reader, writer, executor, chunk_size, encoding)
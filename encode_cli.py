@@ -0,0 +1,387 @@
+"""
+Command line tool for encrypting and decrypting files, using the
+encode_bytes() format.
+
+    python -m encode_cli encrypt notes.txt -o notes.bre
+    python -m encode_cli decrypt notes.bre -o notes.txt
+    python -m encode_cli encrypt big.log --workers 8 --progress
+
+Leaving out -o works on the file in place. Files are memory mapped and
+worked through one window of blocks at a time, so they never have to fit in
+memory, and the output is sized to its exact final length before any
+blocks are written.
+
+The password comes from --password, the BRE_PASSWORD environment variable,
+or a prompt.
+"""
+
+import argparse
+import getpass
+import mmap
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from encode_v2 import (
+    BYTES_HEADER,
+    STRING_LENGTH,
+    KeyScheduleIndex,
+    decode_blocks_bytes,
+    encode_blocks_bytes,
+    get_bytes_header,
+    iter_key_blocks,
+    pad_bytes,
+    read_bytes_header,
+)
+
+# Number of blocks handled in each window (1 MiB with 32 character blocks)
+WINDOW_BLOCKS = 32768
+# Environment variable the password can be given in
+PASSWORD_ENV = "BRE_PASSWORD"
+
+
+class Progress:
+    """
+    Prints how far along a file is and how fast it is going to stderr.
+    Does nothing unless enabled.
+    """
+
+    def __init__(self, total, enabled=False):
+        self.total = total
+        self.enabled = enabled
+        self.done = 0
+        self.start = time.perf_counter()
+
+    def update(self, amount):
+        """
+        Adds amount bytes to the finished count and prints the progress.
+        """
+        self.done += amount
+        if self.enabled:
+            elapsed = time.perf_counter() - self.start
+            percent = 100 * self.done / self.total if self.total else 100
+            sys.stderr.write(
+                f"\r{self.done / 2**20:.1f}/{self.total / 2**20:.1f} MiB "
+                f"({percent:.0f}%) {self.rate(elapsed):.2f} MiB/s"
+            )
+            sys.stderr.flush()
+
+    def rate(self, elapsed):
+        """
+        Returns the throughput so far in MiB per second.
+        """
+        return (self.done / 2**20) / elapsed if elapsed > 0 else 0.0
+
+    def finish(self):
+        """
+        Prints the final totals.
+        """
+        if self.enabled:
+            elapsed = time.perf_counter() - self.start
+            sys.stderr.write(
+                f"\nDone: {self.done / 2**20:.1f} MiB in {elapsed:.2f}s "
+                f"({self.rate(elapsed):.2f} MiB/s)\n"
+            )
+
+
+def preallocate(file, size):
+    """
+    Sets the file to its final size, reserving the disk space where the
+    system supports it.
+    """
+    file.truncate(size)
+    if size and hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(file.fileno(), 0, size)
+        except OSError:
+            pass  # Not every file system supports it; truncate is enough
+
+
+def map_file(file, size, writable):
+    """
+    Memory maps the first size bytes of an open file. Returns None for an
+    empty file, which mmap can not map.
+    """
+    if size == 0:
+        return None
+    access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+    return mmap.mmap(file.fileno(), size, access=access)
+
+
+def run_window(function, data, key, pool, workers):
+    """
+    Runs function(data, key) over a window, split into one block-aligned
+    piece per worker when there is a pool.
+    """
+    if pool is None:
+        return function(data, key)
+
+    block_count = len(data) // STRING_LENGTH
+    piece = -(-block_count // workers) * STRING_LENGTH
+    starts = range(0, len(data), piece)
+    results = pool.map(
+        function,
+        [data[x : (x + piece)] for x in starts],
+        [key[x : (x + piece)] for x in starts],
+    )
+
+    return b"".join(results)
+
+
+def check_source(source, data_length, window):
+    """
+    Raises a ValueError if any byte of the source is 128 or above.
+    """
+    for start in range(0, data_length, window):
+        if not source[start : (start + window)].isascii():
+            raise ValueError(
+                f"Only bytes below 128 can be encrypted (near byte {start})"
+            )
+
+
+def is_same_file(source, destination):
+    """
+    Returns True if destination is the source file, under any name.
+    """
+    return (
+        destination is not None
+        and os.path.exists(destination)
+        and os.path.samefile(source, destination)
+    )
+
+
+def encrypt_window(source, start, end, data_length, key, pool, workers):
+    """
+    Encrypts the blocks between byte start and end of the (padded) data,
+    using key (their password_arrays as bytes).
+    """
+    data = source[start : min(end, data_length)]
+
+    # Pad out the last block the same way set_string() does
+    if len(data) < end - start:
+        last_block = len(data) - (len(data) % STRING_LENGTH)
+        data = data[:last_block] + pad_bytes(data[last_block:], key[last_block:])
+
+    if not data.isascii():
+        raise ValueError(f"Only bytes below 128 can be encrypted (near byte {start})")
+
+    return run_window(encode_blocks_bytes, data, key, pool, workers)
+
+
+def encrypt_file(
+    source,
+    password,
+    destination=None,
+    workers=1,
+    window_blocks=WINDOW_BLOCKS,
+    progress=False,
+):
+    """
+    Encrypts the source file into destination, or in place if there is no
+    destination (or it is the source file). Returns the size of the encrypted
+    file.
+
+    In place, the file is first grown to its final size, then the windows are
+    done from last to first so no data is overwritten before it is read. A
+    KeyScheduleIndex finds the key for each window, dropping its checkpoints
+    once the windows have moved below them. Otherwise the windows are done
+    in order and the key is read straight off iter_key_blocks().
+    """
+    # Opening the source again to write to would empty it, so work in place
+    if is_same_file(source, destination):
+        destination = None
+
+    data_length = os.path.getsize(source)
+    pad_length = -data_length % STRING_LENGTH
+    body_length = data_length + pad_length
+    total_length = BYTES_HEADER.size + body_length
+    window = window_blocks * STRING_LENGTH
+
+    report = Progress(data_length, progress)
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+
+    try:
+        if destination is None:
+            index = KeyScheduleIndex(password)
+            with open(source, "r+b") as file:
+                # Check everything first so a bad byte can't leave a half
+                # encrypted file behind
+                source_map = map_file(file, data_length, writable=False)
+                check_source(source_map, data_length, window)
+                if source_map is not None:
+                    source_map.close()
+                preallocate(file, total_length)
+                output = map_file(file, total_length, writable=True)
+                # Work backwards, since each block moves further into the file
+                for start in reversed(range(0, body_length, window)):
+                    end = min(start + window, body_length)
+                    block = start // STRING_LENGTH
+                    key = index.key_bytes(block, (end - start) // STRING_LENGTH)
+                    output[(BYTES_HEADER.size + start) : (BYTES_HEADER.size + end)] = (
+                        encrypt_window(
+                            output, start, end, data_length, key, pool, workers
+                        )
+                    )
+                    # The windows after this one are done with
+                    index.drop_checkpoints(index.locate(block)[0])
+                    report.update(min(end, data_length) - start)
+                output[: BYTES_HEADER.size] = get_bytes_header(pad_length)
+                output.close()
+        else:
+            key_blocks = iter_key_blocks(password)
+            with open(source, "rb") as input_file, open(destination, "w+b") as file:
+                source_map = map_file(input_file, data_length, writable=False)
+                preallocate(file, total_length)
+                output = map_file(file, total_length, writable=True)
+                output[: BYTES_HEADER.size] = get_bytes_header(pad_length)
+                for start in range(0, body_length, window):
+                    end = min(start + window, body_length)
+                    key = b"".join(islice(key_blocks, (end - start) // STRING_LENGTH))
+                    output[(BYTES_HEADER.size + start) : (BYTES_HEADER.size + end)] = (
+                        encrypt_window(
+                            source_map, start, end, data_length, key, pool, workers
+                        )
+                    )
+                    report.update(min(end, data_length) - start)
+                output.close()
+                if source_map is not None:
+                    source_map.close()
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    report.finish()
+    return total_length
+
+
+def decrypt_file(
+    source,
+    password,
+    destination=None,
+    workers=1,
+    window_blocks=WINDOW_BLOCKS,
+    progress=False,
+):
+    """
+    Decrypts the source file into destination, or in place if there is no
+    destination (or it is the source file). Returns the size of the decrypted
+    file.
+
+    In place, each block moves towards the start of the file, so the windows
+    are done in order and the file is cut down to size at the end.
+    """
+    # Opening the source again to write to would empty it, so work in place
+    if is_same_file(source, destination):
+        destination = None
+
+    with open(source, "rb") as file:
+        pad_length = read_bytes_header(file.read(BYTES_HEADER.size))
+    body_length = os.path.getsize(source) - BYTES_HEADER.size
+    if body_length % STRING_LENGTH or pad_length > body_length:
+        raise ValueError(f"{source} has been cut short or its header is damaged")
+    data_length = body_length - pad_length
+    window = window_blocks * STRING_LENGTH
+
+    report = Progress(data_length, progress)
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+
+    def decrypt_windows(source_map, output):
+        key_blocks = iter_key_blocks(password)
+        for start in range(0, body_length, window):
+            end = min(start + window, body_length)
+            key = b"".join(islice(key_blocks, (end - start) // STRING_LENGTH))
+            data = source_map[(BYTES_HEADER.size + start) : (BYTES_HEADER.size + end)]
+            decrypted = run_window(decode_blocks_bytes, data, key, pool, workers)
+            # Cut the padding off the last block
+            decrypted = decrypted[: data_length - start]
+            output[start : (start + len(decrypted))] = decrypted
+            report.update(len(decrypted))
+
+    try:
+        if destination is None:
+            with open(source, "r+b") as file:
+                output = map_file(file, BYTES_HEADER.size + body_length, writable=True)
+                decrypt_windows(output, output)
+                output.close()
+                file.truncate(data_length)
+        else:
+            with open(source, "rb") as input_file, open(destination, "w+b") as file:
+                source_map = map_file(
+                    input_file, BYTES_HEADER.size + body_length, writable=False
+                )
+                preallocate(file, data_length)
+                output = map_file(file, data_length, writable=True)
+                if output is not None:
+                    decrypt_windows(source_map, output)
+                    output.close()
+                source_map.close()
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    report.finish()
+    return data_length
+
+
+def get_password(password):
+    """
+    Returns the password given on the command line, from PASSWORD_ENV, or
+    asks for it.
+    """
+    if password is None:
+        password = os.environ.get(PASSWORD_ENV)
+    if password is None:
+        password = getpass.getpass("Password: ")
+    return password
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m encode_cli",
+        description="Encrypt or decrypt files with Binary-Reduction-Encryption.",
+    )
+    parser.add_argument("action", choices=("encrypt", "decrypt"))
+    parser.add_argument("source", help="file to read")
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="file to write (the source is changed in place if left out)",
+    )
+    parser.add_argument(
+        "-p", "--password", help=f"password (defaults to ${PASSWORD_ENV} or a prompt)"
+    )
+    parser.add_argument(
+        "-w", "--workers", type=int, default=1, help="number of worker processes"
+    )
+    parser.add_argument(
+        "--window",
+        type=int,
+        default=WINDOW_BLOCKS,
+        help=f"blocks per window (default {WINDOW_BLOCKS})",
+    )
+    parser.add_argument(
+        "--progress", action="store_true", help="print progress and throughput"
+    )
+    args = parser.parse_args(argv)
+
+    if args.workers < 1 or args.window < 1:
+        parser.error("--workers and --window must be at least 1")
+
+    function = encrypt_file if args.action == "encrypt" else decrypt_file
+    try:
+        function(
+            args.source,
+            get_password(args.password),
+            destination=args.output,
+            workers=args.workers,
+            window_blocks=args.window,
+            progress=args.progress,
+        )
+    except (OSError, ValueError) as error:
+        parser.exit(1, f"{parser.prog}: error: {error}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Batch versions of encode() and decode() for lots of small messages, using
+NumPy.
+
+All of the messages share one key schedule, and every block of every
+message is packed into one bit matrix (one row of 16 * STRING_LENGTH bits
+per block). The reduction and its reverse are then done for the whole batch
+at once with array operations.
+
+    from encode_numpy import encode_many, decode_many
+
+    encrypted = encode_many(["hi", "hello", "hey"], "password")
+    decode_many(encrypted, "password")  # ["hi", "hello", "hey"]
+"""
+
+from itertools import islice
+
+import numpy as np
+
+from encode_v2 import (
+    STRING_LENGTH,
+    decode_stream,
+    encode_stream,
+    get_codes_string,
+    get_submasks,
+    get_symbol_codes,
+    iter_key_blocks,
+    iter_symbols,
+    trim_null_string,
+)
+
+
+def get_key_matrix(password, block_count):
+    """
+    Returns the password_arrays of the first block_count blocks as a
+    (block_count, STRING_LENGTH) uint8 matrix.
+    """
+    key = b"".join(islice(iter_key_blocks(password), block_count))
+    return np.frombuffer(key, dtype=np.uint8).reshape(block_count, STRING_LENGTH)
+
+
+def get_message_codes(message):
+    """
+    Returns the symbols of a message as bytes (see get_symbol_codes()), or
+    None if it has characters that need more than one byte.
+    """
+    if not message.isascii():
+        return None
+    # Without a \ there are no NULL_STRINGs, so every character is a symbol
+    if "\\" not in message:
+        return message.encode("ascii")
+    return get_symbol_codes(iter_symbols(message))
+
+
+def reduce_bits(bits):
+    """
+    The binary reduction for a whole (blocks, 16 * STRING_LENGTH) bit matrix at
+    once. Like fast_binary_reduction(), each output bit is the XOR of the bits
+    at every submask of the number of passes after it.
+    """
+    passes = bits.shape[1] - (8 * STRING_LENGTH)
+    result = np.zeros((bits.shape[0], 8 * STRING_LENGTH), dtype=np.uint8)
+    for k in get_submasks(passes):
+        result ^= bits[:, k : (k + (8 * STRING_LENGTH))]
+
+    return result
+
+
+def rebuild_bits(binary_bits, password_bits):
+    """
+    The reverse of reduce_bits(), working one column at a time across the whole
+    batch the same way fast_binary_rebuild() works one bit at a time.
+    Returns just the rebuilt string bits.
+    """
+    password_length = password_bits.shape[1]
+    binary_length = binary_bits.shape[1]
+    offsets = get_submasks(password_length)[1:]
+
+    # Every needed top row bit belongs to the password
+    if offsets == [0] and password_length >= binary_length:
+        return binary_bits ^ password_bits[:, :binary_length]
+
+    rebuilt = np.concatenate([password_bits, np.zeros_like(binary_bits)], axis=1)
+    for j in range(binary_length):
+        column = binary_bits[:, j].copy()
+        for k in offsets:
+            column ^= rebuilt[:, j + k]
+        rebuilt[:, password_length + j] = column
+
+    return rebuilt[:, password_length:]
+
+
+def encode_many(messages, password):
+    """
+    Gives the same list of results as calling encode() on each message, with
+    one key schedule and one set of array operations for the whole batch.
+
+    Messages with characters past the first 128 are passed to encode_stream()
+    one at a time instead.
+    """
+    results = [None] * len(messages)
+    blocks = []  # (message number, block number, codes) for each block
+
+    for number, message in enumerate(messages):
+        codes = get_message_codes(message)
+        if codes is None:
+            results[number] = "".join(encode_stream(message, password))
+            continue
+        for x in range(0, len(codes), STRING_LENGTH):
+            blocks.append((number, x // STRING_LENGTH, codes[x : (x + STRING_LENGTH)]))
+
+    if not blocks:
+        return [result if result is not None else "" for result in results]
+
+    block_numbers = np.array([block for _, block, _ in blocks])
+    key_matrix = get_key_matrix(password, int(block_numbers.max()) + 1)
+    password_matrix = key_matrix[block_numbers]
+
+    string_matrix = np.empty((len(blocks), STRING_LENGTH), dtype=np.uint8)
+    for row, (_, block, codes) in enumerate(blocks):
+        # Pad out the last block the same way set_string() does
+        if len(codes) < STRING_LENGTH:
+            codes = (codes + bytes(3))[:STRING_LENGTH]
+            codes += key_matrix[block, len(codes) :].tobytes()
+        string_matrix[row] = np.frombuffer(codes, dtype=np.uint8)
+
+    bits = np.unpackbits(
+        np.concatenate([password_matrix, string_matrix], axis=1), axis=1
+    )
+    encrypted_matrix = np.packbits(reduce_bits(bits), axis=1)
+
+    # Put each message's blocks back together
+    pieces = [[] for _ in messages]
+    for row, (number, _, _) in enumerate(blocks):
+        pieces[number].append(get_codes_string(encrypted_matrix[row].tobytes()))
+    for number, result in enumerate(results):
+        if result is None:
+            results[number] = "".join(pieces[number])
+
+    return results
+
+
+def decode_many(messages, password):
+    """
+    Gives the same list of results as calling decode() on each encoded
+    message, with one key schedule and one set of array operations for the
+    whole batch.
+    """
+    results = [None] * len(messages)
+    blocks = []  # (message number, block number, codes) for each block
+
+    for number, message in enumerate(messages):
+        codes = get_message_codes(message)
+        if codes is None:
+            results[number] = "".join(decode_stream(message, password))
+            continue
+        # Like decode(), a last block that was cut short is left out
+        for x in range(0, len(codes) - STRING_LENGTH + 1, STRING_LENGTH):
+            blocks.append((number, x // STRING_LENGTH, codes[x : (x + STRING_LENGTH)]))
+
+    if blocks:
+        block_numbers = np.array([block for _, block, _ in blocks])
+        key_matrix = get_key_matrix(password, int(block_numbers.max()) + 1)
+        password_bits = np.unpackbits(key_matrix[block_numbers], axis=1)
+        binary_bits = np.unpackbits(
+            np.frombuffer(
+                b"".join(codes for _, _, codes in blocks), dtype=np.uint8
+            ).reshape(len(blocks), STRING_LENGTH),
+            axis=1,
+        )
+        decrypted_matrix = np.packbits(rebuild_bits(binary_bits, password_bits), axis=1)
+    else:
+        decrypted_matrix = np.empty((0, STRING_LENGTH), dtype=np.uint8)
+
+    pieces = [[] for _ in messages]
+    for row, (number, _, _) in enumerate(blocks):
+        pieces[number].append(get_codes_string(decrypted_matrix[row].tobytes()))
+    for number, result in enumerate(results):
+        if result is None:
+            results[number] = trim_null_string("".join(pieces[number]))
+
+    return results
@@ -1,6 +1,209 @@
+import cProfile
+import hashlib
+import os
+import pstats
+import struct
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import wraps
+from itertools import islice
+
 # GLOBAL VARIABLES
 STRING_LENGTH = 32
 NULL_STRING = "\\x00"
+# Which engine does the binary work. "fast" uses integer math,
+# "reference" uses the original character-by-character string path.
+ENGINE = "fast"
+ENGINES = ("fast", "reference")
+# How many passwords keep their hash arrays cached between calls
+KEY_CACHE_SIZE = 64
+# How many hash array generations are kept for each cached password
+KEY_CACHE_GENERATIONS = 64
+# How many characters to read at a time when streaming from a file
+STREAM_CHUNK_SIZE = 8192
+# How many blocks each worker is handed at a time in parallel mode
+PARALLEL_BATCH_SIZE = 256
+# How many hash array generations apart the KeyScheduleIndex checkpoints are
+KEY_INDEX_INTERVAL = 16
+# Most checkpoints a KeyScheduleIndex keeps (128 bytes each)
+KEY_INDEX_CHECKPOINTS = 4096
+# Header for encode_bytes(): magic, format version, block size, pad length
+BYTES_MAGIC = b"BRE"
+BYTES_VERSION = 1
+BYTES_HEADER = struct.Struct(">3sBHH")
+# Encoder.state(): version, generation, offset, leftover length, symbol count,
+# first 8 bytes of the password digest
+ENCODER_STATE_VERSION = 2
+ENCODER_STATE = struct.Struct(">BQBBB8s")
+# Set by enable_instrumentation(); None keeps every hook switched off
+INSTRUMENTATION = None
+# Background thread for iter_password_arrays(prefetch=True), started when needed
+PREFETCH_EXECUTOR = None
+PREFETCH_LOCK = threading.Lock()
+
+
+class Instrumentation:
+    """
+    Counters and timers for the different phases, filled in while it is
+    enabled (see enable_instrumentation() and instrument()).
+
+    Counters: encode_calls, decode_calls, key_schedule_derivations,
+    blocks_encoded, blocks_decoded, null_string_hits, hash_array_regenerations
+    Timers: set_hash_array, set_encode, set_decrypt
+
+    Observers are called as observer(name, value) for every count (value is
+    the amount added) and every timing (value is the seconds taken).
+    """
+
+    def __init__(self):
+        self.counters = {}
+        # Timer name -> [number of calls, total seconds]
+        self.timers = {}
+        self.observers = []
+        self.lock = threading.Lock()
+        # Filled in by instrument() when asked for
+        self.profile = None
+        self.memory = None
+
+    def count(self, name, amount=1):
+        """
+        Adds amount to a counter.
+        """
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+        for observer in self.observers:
+            observer(name, amount)
+
+    def add_time(self, name, seconds):
+        """
+        Adds one timed call to a timer.
+        """
+        with self.lock:
+            timer = self.timers.setdefault(name, [0, 0.0])
+            timer[0] += 1
+            timer[1] += seconds
+        for observer in self.observers:
+            observer(name, seconds)
+
+    def add_observer(self, observer):
+        """
+        Adds a callback that gets observer(name, value) for every event.
+        """
+        self.observers.append(observer)
+
+    def remove_observer(self, observer):
+        """
+        Removes a callback added with add_observer().
+        """
+        self.observers.remove(observer)
+
+    def snapshot(self):
+        """
+        Returns a copy of the counters and timers as a dictionary.
+        """
+        with self.lock:
+            return {
+                "counters": dict(self.counters),
+                "timers": {
+                    name: {"calls": calls, "seconds": seconds}
+                    for name, (calls, seconds) in self.timers.items()
+                },
+            }
+
+    def reset(self):
+        """
+        Sets every counter and timer back to zero.
+        """
+        with self.lock:
+            self.counters.clear()
+            self.timers.clear()
+
+
+def enable_instrumentation(instrumentation=None):
+    """
+    Turns the hooks on, recording into the given Instrumentation (or a new
+    one). Returns the Instrumentation in use.
+    """
+    global INSTRUMENTATION
+    INSTRUMENTATION = instrumentation or Instrumentation()
+    return INSTRUMENTATION
+
+
+def disable_instrumentation():
+    """
+    Turns the hooks back off. Returns the Instrumentation that was in use.
+    """
+    global INSTRUMENTATION
+    instrumentation, INSTRUMENTATION = INSTRUMENTATION, None
+    return instrumentation
+
+
+@contextmanager
+def instrument(profile=False, trace_memory=False):
+    """
+    Turns instrumentation on for a with block and gives back the
+    Instrumentation:
+
+        with instrument(profile=True, trace_memory=True) as metrics:
+            encode(string, password)
+        metrics.snapshot(), metrics.profile.print_stats(), metrics.memory
+
+    With profile, metrics.profile is a pstats.Stats of the block. With
+    trace_memory, metrics.memory is tracemalloc's (current, peak) bytes.
+    """
+    previous = INSTRUMENTATION
+    instrumentation = enable_instrumentation()
+    profiler = cProfile.Profile() if profile else None
+    start_tracing = trace_memory and not tracemalloc.is_tracing()
+
+    if start_tracing:
+        tracemalloc.start()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield instrumentation
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            instrumentation.profile = pstats.Stats(profiler)
+        if trace_memory:
+            instrumentation.memory = tracemalloc.get_traced_memory()
+        if start_tracing:
+            tracemalloc.stop()
+        # Put back whatever was in use before
+        if previous is not None:
+            enable_instrumentation(previous)
+        else:
+            disable_instrumentation()
+
+
+def instrumented(timer, counter):
+    """
+    Decorator that times each call under timer and adds one to counter, but
+    only while instrumentation is on. Otherwise it just calls the function.
+    """
+
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            instrumentation = INSTRUMENTATION
+            if instrumentation is None:
+                return function(*args, **kwargs)
+
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                instrumentation.add_time(timer, time.perf_counter() - start)
+                instrumentation.count(counter)
+
+        return wrapper
+
+    return decorator
 
 
 def set_base_hash_array():
@@ -16,7 +219,130 @@ def set_base_hash_array():
     return base_hash_array
 
 
-def set_hash_array(hash_array, password):
+# Lookup tables for every symbol in the base hash array (plus the null
+# character, which has the same binary as the NULL_STRING)
+SYMBOL_CODES = {symbol: code for code, symbol in enumerate(set_base_hash_array())}
+SYMBOL_CODES[chr(0)] = 0
+SYMBOL_BINARIES = {
+    symbol: "{:08b}".format(code) for symbol, code in SYMBOL_CODES.items()
+}
+# For str.translate(), to turn decoded 0 bytes into NULL_STRINGs
+NULL_TRANSLATION = {0: NULL_STRING}
+
+
+def lookup_symbol_codes(symbols):
+    """
+    Returns the symbols as bytes using SYMBOL_CODES, or None if any of them
+    is not in the table (those need get_binary()'s UTF-8 handling).
+    """
+    try:
+        return bytes([SYMBOL_CODES[symbol] for symbol in symbols])
+    except KeyError:
+        return None
+
+
+def get_codes_string(codes):
+    """
+    Turns bytes of symbol codes back into text, with 0 as a NULL_STRING. Does
+    the same as get_string() on their binary.
+    """
+    # Below 128 every byte is a single character, so do them all at once
+    if codes.isascii():
+        return codes.decode("ascii").translate(NULL_TRANSLATION)
+
+    # Otherwise one at a time, which fails the same way get_string() always has
+    return "".join(
+        NULL_STRING if n == 0 else n.to_bytes(1, "big").decode() for n in codes
+    )
+
+
+def get_hash_permutation(password_ords, array_length):
+    """
+    Works out where set_hash_array() moves every position of an array of
+    array_length values, for the padded password given as a tuple of ords.
+
+    The swapping never looks at the characters themselves, and the swap
+    chain followed from each index only depends on the password. So one
+    pass over the array always moves things around the same way:
+    - Simulate a single pass once to find where each position ends up
+    - Every password character is then a rotation (done with an offset
+      table) followed by that same pass, each a single bytes.translate
+
+    Because none of this depends on the hash array, the HashArrayChain (or
+    KeyScheduleIndex) of the password keeps the result, and every later
+    generation for the same password is just a lookup.
+    """
+    # Simulate one pass over an array of positions
+    one_pass = bytearray(range(array_length))
+    for index in range(array_length):
+        # The starting value is carried to the end of the swap chain
+        char_holder = one_pass[index]
+        for p in password_ords:
+            swap_index = index + p
+            if swap_index > array_length - 1:
+                swap_index -= array_length - 1
+            # Same failure set_hash_array() hits for oversized characters
+            if swap_index > array_length - 1:
+                raise IndexError("list index out of range")
+            one_pass[index] = one_pass[swap_index]
+            index = swap_index
+        one_pass[index] = char_holder
+    one_pass = bytes(one_pass)
+
+    # Positions into the hash array, shuffled in place of the characters
+    positions = bytes(range(array_length)) + bytes(256 - array_length)
+    # Tables that move a position forward by a rotation offset
+    offset_tables = {}
+
+    for p_word in password_ords:
+        # Shifting by more than the array length leaves it as is
+        offset = p_word if p_word < array_length else 0
+        if offset not in offset_tables:
+            offset_tables[offset] = bytes(
+                (x + offset) % array_length if x < array_length else x
+                for x in range(256)
+            )
+
+        # Rotate, then apply the pass
+        rotated_pass = one_pass.translate(offset_tables[offset])
+        positions = rotated_pass.translate(positions) + positions[array_length:]
+
+    return positions[:array_length]
+
+
+def fast_set_hash_array(hash_array, password, permutations=None):
+    """
+    Gives the exact same result as set_hash_array(), using the position
+    shuffle from get_hash_permutation(). It is kept in permutations (a
+    dictionary) if one is given.
+    """
+    array_length = len(hash_array)
+
+    # Positions have to fit in a byte, otherwise use the original
+    if array_length == 0 or array_length > 256:
+        return set_hash_array(hash_array, password, engine="reference")
+
+    # Pad the password the same way set_hash_array() does
+    padding = set_base_hash_array()
+    if len(password) < 17:
+        password_padded = password + padding[len(password) : STRING_LENGTH]
+    else:
+        password_padded = password
+    password_ords = tuple(ord(p) for p in password_padded)
+
+    key = (password_ords, array_length)
+    permutation = permutations.get(key) if permutations is not None else None
+    if permutation is None:
+        permutation = get_hash_permutation(password_ords, array_length)
+        if permutations is not None:
+            permutations[key] = permutation
+
+    # Swap the characters into their new positions
+    return [hash_array[x] for x in permutation]
+
+
+@instrumented("set_hash_array", "key_schedule_derivations")
+def set_hash_array(hash_array, password, engine=None, permutations=None):
     """
     Shifts the array based on each ord(p_word) value.
     Then it loops through the whole hash array, noting each
@@ -27,6 +353,9 @@ def set_hash_array(hash_array, password):
     moving to the next letter.
     This fully mixes the array in a way that can be consistently
     recalculated over and over.
+
+    permutations is an optional dictionary the fast engine keeps its position
+    shuffles in, so the same password is only worked out once.
     """
     # LONG STORY SHORT:
     # -password is 20 long
@@ -43,6 +372,10 @@ def set_hash_array(hash_array, password):
     # -repeat all this
     # - i.e. if len(password) = 17, this will loop 17 * 128 * 17 times, equaling 36,992 total loops
 
+    # The fast engine gives the same result on a compact array of positions
+    if get_engine(engine) == "fast":
+        return fast_set_hash_array(hash_array, password, permutations)
+
     # Get consistent array for padding
     padding = set_base_hash_array()
     # Pad out short passwords to match the STRING_LENGTH
@@ -81,13 +414,295 @@ def set_hash_array(hash_array, password):
     return hash_array
 
 
+class HashArrayChain:
+    """
+    Holds the chain of hash arrays for one password. The first generation is
+    set_hash_array(set_base_hash_array(), password), and every generation after
+    that is set_hash_array() of the one before it.
+
+    Generations are worked out as they are asked for and the first
+    max_generations of them are kept, along with the position shuffle of the
+    fast engine. The arrays handed out are shared, so they should not be
+    changed.
+    """
+
+    def __init__(self, password, max_generations=KEY_CACHE_GENERATIONS):
+        self.password = list(password)
+        self.max_generations = max_generations
+        self.generations = []
+        # Position shuffles for set_hash_array()
+        self.permutations = {}
+        self.lock = threading.Lock()
+
+    def generation(self, number, previous=None):
+        """
+        Returns hash array generation `number` (0 is the first hash array).
+
+        Generations past max_generations are not kept, so pass in generation
+        number - 1 as previous to avoid working them all out again.
+        """
+        with self.lock:
+            if number < len(self.generations):
+                return self.generations[number]
+
+            # Start from the given previous generation if there is one,
+            # otherwise from the last kept generation
+            if previous is not None:
+                current, hash_array = number - 1, previous
+            elif self.generations:
+                current = len(self.generations) - 1
+                hash_array = self.generations[current]
+            else:
+                current, hash_array = -1, set_base_hash_array()
+
+            while current < number:
+                hash_array = set_hash_array(
+                    hash_array, self.password, permutations=self.permutations
+                )
+                current += 1
+                # Keep it if it is the next generation in line
+                if current == len(self.generations) < self.max_generations:
+                    self.generations.append(hash_array)
+
+            return hash_array
+
+
+class KeyScheduleCache:
+    """
+    A thread-safe LRU cache of HashArrayChain objects keyed by the password,
+    so repeated calls with the same password skip set_hash_array() entirely.
+    Everything worked out for a password lives in its chain, so dropping the
+    chain drops all of it.
+
+    - maxsize is the number of passwords to keep (0 turns the cache off)
+    - max_generations is how many hash arrays to keep for each password
+    - The least recently used password is dropped once maxsize is reached
+    """
+
+    def __init__(self, maxsize=KEY_CACHE_SIZE, max_generations=KEY_CACHE_GENERATIONS):
+        self.maxsize = maxsize
+        self.max_generations = max_generations
+        self.chains = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, password):
+        """
+        Returns the HashArrayChain for the password, creating it if needed.
+        """
+        key = tuple(password)
+        with self.lock:
+            chain = self.chains.get(key)
+            if chain is not None:
+                self.hits += 1
+                # Mark it as the most recently used
+                self.chains.move_to_end(key)
+                return chain
+
+            self.misses += 1
+            chain = HashArrayChain(password, self.max_generations)
+            if self.maxsize > 0:
+                self.chains[key] = chain
+                self.evict()
+            return chain
+
+    def put(self, password, chain):
+        """
+        Adds an already made HashArrayChain for the password (for example one
+        loaded by key_store.KeyStore), replacing any chain already there.
+        """
+        key = tuple(password)
+        with self.lock:
+            if self.maxsize > 0:
+                self.chains[key] = chain
+                self.chains.move_to_end(key)
+                self.evict()
+
+    def evict(self):
+        """
+        Drops the least recently used chains until the cache fits maxsize.
+        Expects the lock to be held.
+        """
+        while len(self.chains) > max(self.maxsize, 0):
+            self.chains.popitem(last=False)
+            self.evictions += 1
+
+    def resize(self, maxsize):
+        """
+        Changes the number of passwords kept, dropping any extras.
+        """
+        with self.lock:
+            self.maxsize = maxsize
+            self.evict()
+
+    def invalidate(self, password):
+        """
+        Removes a single password from the cache. Returns True if it was there.
+        """
+        with self.lock:
+            return self.chains.pop(tuple(password), None) is not None
+
+    def clear(self):
+        """
+        Empties the cache and resets the counters.
+        """
+        with self.lock:
+            self.chains.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        """
+        Returns the cache counters as a dictionary.
+        """
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self.chains),
+                "maxsize": self.maxsize,
+            }
+
+
+# Shared cache used by encode() and decode()
+KEY_SCHEDULE_CACHE = KeyScheduleCache()
+
+
+class KeyScheduleIndex:
+    """
+    Finds the password_array for any block without going through all of the
+    blocks before it.
+
+    Block b uses the STRING_LENGTH hash characters starting at b * STRING_LENGTH
+    of all the hash array generations joined together, so locate() can tell
+    which generation (and offset into it) that is. Every checkpoint_interval-th
+    generation is kept as it is worked out (as bytes, see get_symbol_codes()),
+    so reaching any generation only costs the distance from the nearest
+    checkpoint below it.
+
+    Once there are more than max_checkpoints, every other one is dropped and
+    the interval doubled, so a long file never holds more than
+    max_checkpoints * 128 bytes of them.
+    """
+
+    def __init__(
+        self,
+        password,
+        checkpoint_interval=KEY_INDEX_INTERVAL,
+        max_checkpoints=KEY_INDEX_CHECKPOINTS,
+    ):
+        if max_checkpoints < 1:
+            raise ValueError("max_checkpoints must be at least 1")
+        self.password = [p for p in password]
+        self.checkpoint_interval = checkpoint_interval
+        self.max_checkpoints = max_checkpoints
+        self.symbols = set_base_hash_array()
+        self.hash_array_length = len(self.symbols)
+        # Kept generations as bytes, by generation number
+        self.checkpoints = {}
+        # Position shuffles for set_hash_array()
+        self.permutations = {}
+        # The last generation worked out, for reading blocks in order
+        self.last_generation = None
+        self.lock = threading.Lock()
+
+    def locate(self, block):
+        """
+        Returns (generation, offset) of the first hash character used by block.
+        """
+        return divmod(block * STRING_LENGTH, self.hash_array_length)
+
+    def generation(self, number, previous=None):
+        """
+        Returns hash array generation `number` (0 is the first hash array).
+        Like HashArrayChain.generation(), previous can be generation
+        number - 1, so a KeyStream can step through the index.
+        """
+        with self.lock:
+            if self.last_generation and self.last_generation[0] == number:
+                return self.last_generation[1]
+
+            if previous is not None:
+                current, hash_array = number - 1, previous
+            else:
+                # Find the nearest checkpoint at or below the generation
+                current = max((x for x in self.checkpoints if x <= number), default=-1)
+                # Also start from the last generation if that is closer
+                if self.last_generation and current < self.last_generation[0] < number:
+                    current, hash_array = self.last_generation
+                elif current >= 0:
+                    hash_array = [self.symbols[x] for x in self.checkpoints[current]]
+                else:
+                    hash_array = set_base_hash_array()
+
+            # Step forward to the generation, keeping any checkpoints passed
+            while current < number:
+                hash_array = set_hash_array(
+                    hash_array, self.password, permutations=self.permutations
+                )
+                current += 1
+                if current % self.checkpoint_interval == 0:
+                    self.checkpoints[current] = get_symbol_codes(hash_array)
+                    if len(self.checkpoints) > self.max_checkpoints:
+                        self.thin_checkpoints()
+
+            self.last_generation = (number, hash_array)
+            return hash_array
+
+    def thin_checkpoints(self):
+        """
+        Doubles the checkpoint_interval and drops the checkpoints that are no
+        longer on it, until there are no more than max_checkpoints. Expects
+        the lock to be held.
+        """
+        while len(self.checkpoints) > self.max_checkpoints:
+            self.checkpoint_interval *= 2
+            self.checkpoints = {
+                number: codes
+                for number, codes in self.checkpoints.items()
+                if number % self.checkpoint_interval == 0
+            }
+
+    def drop_checkpoints(self, number):
+        """
+        Drops the checkpoints past generation `number`, once nothing after it
+        will be asked for again (like encode_cli working backwards through a
+        file).
+        """
+        with self.lock:
+            self.checkpoints = {
+                x: codes for x, codes in self.checkpoints.items() if x <= number
+            }
+            if self.last_generation and self.last_generation[0] > number:
+                self.last_generation = None
+
+    def password_array(self, block):
+        """
+        Returns the password_array encode() and decode() use for block.
+        """
+        return next(iter_password_arrays(self.password, key_chain=self, start=block))
+
+    def key_bytes(self, block, block_count=1):
+        """
+        Returns the password_arrays for block_count blocks starting at block,
+        joined together as bytes (see get_symbol_codes()).
+        """
+        key_stream = iter_password_arrays(self.password, key_chain=self, start=block)
+        return b"".join(map(get_symbol_codes, islice(key_stream, block_count)))
+
+
 def get_binary(string):
     """
     Returns the binary representation of the input letter(s). Keeps consistent length.
     """
-    # Use special logic for NULL_STRING to avoid errors
-    if string == NULL_STRING:
-        return "00000000"
+    # Most symbols are in the lookup table (including NULL_STRING)
+    binary = SYMBOL_BINARIES.get(string)
+    if binary is not None:
+        return binary
     # Otherwise, gives the binary representation of UTF-8 characters
     return "".join("{:08b}".format(d) for d in bytearray(string, "utf-8"))
 
@@ -107,13 +722,57 @@ def binary_reduction(binary):
     Reduces the length by 1 each time.
     """
 
-    new_binary = ""
     # Compare the bit values (technically strings) that are
-    # next to each other
-    for x in range(len(binary) - 1):
-        new_binary += char_compare(binary[x], binary[x + 1])
+    # next to each other, joining them together once at the end
+    return "".join(
+        [char_compare(binary[x], binary[x + 1]) for x in range(len(binary) - 1)]
+    )
+
+
+def get_engine(engine=None):
+    """
+    Returns the engine to use, falling back to the global ENGINE.
+    """
+    if engine is None:
+        engine = ENGINE
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine!r}, expected one of {ENGINES}")
+    return engine
+
+
+def get_submasks(number):
+    """
+    Returns every submask of number (every k where k & number == k),
+    largest first.
+    """
+    submasks = []
+    k = number
+    while True:
+        submasks.append(k)
+        if k == 0:
+            return submasks
+        k = (k - 1) & number
 
-    return new_binary
+
+def fast_binary_reduction(binary_int, binary_length, passes):
+    """
+    Does the same job as calling binary_reduction() `passes` times, but on an
+    integer holding the bits (the first bit of the string is the highest bit).
+
+    Each pass compares neighbouring bits, which is an XOR. Doing that over and
+    over follows Pascal's triangle mod 2, so after `passes` rounds every bit is
+    the XOR of the bits found `k` places to its right, for every k that is a
+    submask of `passes` (Lucas' theorem).
+
+    For the normal encode, passes = 256, so the whole reduction is just the
+    first half XORed with the second half.
+    """
+    result_length = binary_length - passes
+    result = 0
+    for k in get_submasks(passes):
+        result ^= binary_int >> (passes - k)
+
+    return result & ((1 << result_length) - 1)
 
 
 def get_string(binary):
@@ -121,26 +780,33 @@ def get_string(binary):
     Takes in a binary string and loops through it 8-bits at a time, converting
     each step back to its character representation.
     """
-    new_string = ""
+    # Any bits past the last full 8 are left off
+    length = len(binary) // 8
+    if length == 0:
+        return ""
 
-    # Sets range as length of binary string and returns an int
-    for x in range((len(binary) // 8)):
-        # Grabs 8 characters at a time, converts back to an integer
-        n = int(binary[(x * 8) : ((x * 8) + 8)], 2)
-        # Special logic to handle null values
-        if n == 0:
-            new_string += "\\x00"
-        # Otherwise, change those bits back to a character
-        else:
-            new_string += n.to_bytes((n.bit_length() + 7) // 8, "big").decode()
-
-    return new_string
+    # Turn every 8 bits into a byte in one go, then look them all up
+    return get_codes_string(int(binary[: (8 * length)], 2).to_bytes(length, "big"))
 
 
-def set_encode(string, password):
+@instrumented("set_encode", "blocks_encoded")
+def set_encode(string, password, engine=None, block_size=None):
     """
     Handles the various function calls to encode
     """
+    if block_size is None:
+        block_size = STRING_LENGTH
+
+    # The fast engine works on the symbol codes straight from the lookup table
+    if get_engine(engine) == "fast":
+        codes = lookup_symbol_codes(password + string)
+        passes = 8 * (len(codes) - block_size) if codes is not None else 0
+        if passes > 0:
+            binary_int = fast_binary_reduction(
+                int.from_bytes(codes, "big"), 8 * len(codes), passes
+            )
+            return get_codes_string(binary_int.to_bytes(block_size, "big"))
+
     binary_array = []
     # Combine the password and string arrays into one, then loop it
     for character in password + string:
@@ -149,126 +815,331 @@ def set_encode(string, password):
     # Create one long binary from those values
     binary = "".join(binary_array)
 
+    # The fast engine skips straight to the fully reduced binary
+    if get_engine(engine) == "fast":
+        passes = len(binary) - (8 * block_size)
+        if passes > 0:
+            binary_int = fast_binary_reduction(int(binary, 2), len(binary), passes)
+            binary = "{:0{}b}".format(binary_int, 8 * block_size)
+        return get_string(binary)
+
     # This loops through the binary string, reducing it by
     # one (in length) with each pass
     # Stops once the binary length returns back to the
     # pre-defined STRING_LENGTH
-    while len(binary) > (8 * STRING_LENGTH):
+    while len(binary) > (8 * block_size):
         binary = binary_reduction(binary)
 
     # Turn those binary values back into a string
     return get_string(binary)
 
 
-def set_string(string, hash):
+def set_string(string, hash, block_size=None):
     """
     Adds 3 NULL_STRINGS to the end, to signal what characters
     can be removed once decoded.
     Cuts it shorter if necessary to preserve STRING_LENGTH.
     """
+    if block_size is None:
+        block_size = STRING_LENGTH
+
     # Pad out string with 3 nulls
     string = string + ([NULL_STRING] * 3)
 
     # If the string now longer than STRING_LENGTH, cut it shorter
-    if len(string) > STRING_LENGTH:
-        string = string[:STRING_LENGTH]
+    if len(string) > block_size:
+        string = string[:block_size]
 
     # If the string is still too short, pad out with the hash
-    if len(string) < STRING_LENGTH:
-        string = string + hash[len(string) : STRING_LENGTH]
+    if len(string) < block_size:
+        string = string + hash[len(string) : block_size]
 
     return string
 
 
-def encode(string, password):
+def iter_chunks(source):
     """
-    Main function to encode text.
+    Turns the source into an iterator of strings. The source can be a
+    string, a file object (read STREAM_CHUNK_SIZE characters at a time)
+    or any other iterable of strings.
+    """
+    if isinstance(source, str):
+        yield source
+    elif hasattr(source, "read"):
+        chunk = source.read(STREAM_CHUNK_SIZE)
+        while chunk:
+            yield chunk
+            chunk = source.read(STREAM_CHUNK_SIZE)
+    else:
+        yield from source
 
-    Requires a string and a password.
 
-    No length requirements.
+def split_symbols(string):
     """
+    Splits a string into its symbols: single characters, except that a
+    NULL_STRING is one symbol. Returns (symbols, leftover).
 
-    print("Calling encode...")
+    Rather than checking every character, the string is split on NULL_STRING
+    (str.split() finds them left to right, the same as reading through one
+    character at a time), and the pieces in between become single characters
+    with list().
 
-    password = [p for p in password]  # Set the password as an array
-    encrypted_string = ""  # To hold encrypted text.
-    string_array = []  # To store the string as an array
-    skipped_loop = 0  # For handling the \\x00 character
-
-    # Scrambled hash array to use
-    hash_array = set_hash_array(set_base_hash_array(), password)
-    # Next array to use once the first is empty
-    hash_array_next = set_hash_array(hash_array, password)
-
-    for index, step in enumerate(string):
-        # If a NULL_STRING is found, skip over the individual characters
-        # until the next valid character is reached
-        if skipped_loop > 0:
-            skipped_loop -= 1
-            continue
-
-        if step == chr(92):  # The \ character
-            # Check if the \ symbol is part of the NULL_STRING
-            if string[index : (index + 4)] == NULL_STRING:
-                string_array.append(NULL_STRING)
-                # Sets number of loops to skip based on NULL_STRING length
-                skipped_loop = len(NULL_STRING) - 1
-            else:
-                string_array.append(step)  # Only the \ character was found
+    If the string ends partway into what could be a NULL_STRING, those
+    characters are left off the symbols and given back as the leftover.
+    """
+    pieces = string.split(NULL_STRING)
+
+    # Hold back the start of a possible NULL_STRING at the very end
+    leftover = ""
+    last_piece = pieces[-1]
+    for index in range(max(len(last_piece) - len(NULL_STRING) + 1, 0), len(last_piece)):
+        if NULL_STRING.startswith(last_piece[index:]):
+            leftover = last_piece[index:]
+            pieces[-1] = last_piece[:index]
+            break
+
+    symbols = list(pieces[0])
+    for piece in pieces[1:]:
+        symbols.append(NULL_STRING)
+        symbols.extend(piece)
+
+    if INSTRUMENTATION is not None and len(pieces) > 1:
+        INSTRUMENTATION.count("null_string_hits", len(pieces) - 1)
+
+    return symbols, leftover
+
+
+def iter_symbol_lists(source):
+    """
+    Gives back the symbols (see split_symbols()) of the text from
+    iter_chunks() as lists, one for every STREAM_CHUNK_SIZE characters or so.
+
+    If a chunk ends partway into what could be a NULL_STRING, those
+    characters are held back until the next chunk shows if it is one.
+    """
+    leftover = ""  # The start of a possible NULL_STRING from the last chunk
+
+    for chunk in iter_chunks(source):
+        # Big strings are split up so only a piece is ever held as a list
+        for start in range(0, len(chunk), STREAM_CHUNK_SIZE):
+            symbols, leftover = split_symbols(
+                leftover + chunk[start : (start + STREAM_CHUNK_SIZE)]
+            )
+            if symbols:
+                yield symbols
+
+    # Nothing else is coming, so these were just normal characters
+    if leftover:
+        yield list(leftover)
+
+
+def iter_symbols(source):
+    """
+    Steps through the text from iter_chunks() one symbol at a time: single
+    characters, except that a NULL_STRING comes back as a single symbol.
+    """
+    for symbols in iter_symbol_lists(source):
+        yield from symbols
 
+
+def iter_symbol_blocks(source, block_size=None):
+    """
+    Gives back the symbols of the text from iter_chunks() as lists of
+    block_size (STRING_LENGTH by default) symbols. The last list may be
+    shorter.
+    """
+    if block_size is None:
+        block_size = STRING_LENGTH
+
+    block = []
+    for symbols in iter_symbol_lists(source):
+        if block:
+            symbols = block + symbols
+        full_length = len(symbols) - (len(symbols) % block_size)
+        for x in range(0, full_length, block_size):
+            yield symbols[x : (x + block_size)]
+        block = symbols[full_length:]
+
+    if block:
+        yield block
+
+
+class KeyStream:
+    """
+    Gives back the password_array for each block in turn: the next block_size
+    characters of the hash array generations joined together. Made by
+    iter_password_arrays(), which every walk through the key schedule goes
+    through.
+
+    Each generation is only worked out once a block reaches it, so a short
+    message never pays for the next one. Only the block_size characters
+    handed out are copied, never the rest of the hash array. With prefetch,
+    the next generation is started on a background thread as soon as the
+    current one comes into use.
+
+    generation, offset and hash_array say where the next block starts, so a
+    KeyStream can be copied or picked up again later (see Encoder).
+    """
+
+    def __init__(
+        self,
+        key_chain,
+        block_size=STRING_LENGTH,
+        prefetch=False,
+        generation=0,
+        offset=0,
+        hash_array=None,
+    ):
+        self.key_chain = key_chain
+        self.block_size = block_size
+        self.prefetch = prefetch
+        self.generation = generation
+        if hash_array is None:
+            hash_array = key_chain.generation(generation)
+        self.hash_array = hash_array
+        self.offset = offset  # How much of the hash_array has been used
+        self.hash_array_next = None  # Future for the prefetched next generation
+        self.start_prefetch()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        end = self.offset + self.block_size
+        hash_array = self.hash_array
+        if end <= len(hash_array):
+            self.offset = end
+            return hash_array[(end - self.block_size) : end]
+
+        # Not enough characters left, so carry on into the next generation
+        if self.hash_array_next is not None:
+            next_array = self.hash_array_next.result()
         else:
-            # Otherwise, just append the found character
-            string_array.append(step)
+            next_array = self.key_chain.generation(self.generation + 1, hash_array)
+        password_array = (
+            hash_array[self.offset :] + next_array[: (end - len(hash_array))]
+        )
+        self.offset = end - len(hash_array)
+        self.hash_array = next_array
+        self.generation += 1
+        if INSTRUMENTATION is not None:
+            INSTRUMENTATION.count("hash_array_regenerations")
+
+        self.hash_array_next = None
+        self.start_prefetch()
+
+        return password_array
+
+    def start_prefetch(self):
+        """
+        Starts working out the generation after the current one in the
+        background, if prefetch is on.
+        """
+        if self.prefetch:
+            self.hash_array_next = get_prefetch_executor().submit(
+                self.key_chain.generation, self.generation + 1, self.hash_array
+            )
+
+    def copy(self):
+        """
+        Returns a separate KeyStream at the same place as this one.
+        """
+        key_stream = KeyStream.__new__(KeyStream)
+        key_stream.key_chain = self.key_chain
+        key_stream.block_size = self.block_size
+        key_stream.prefetch = self.prefetch
+        key_stream.generation = self.generation
+        key_stream.hash_array = self.hash_array
+        key_stream.offset = self.offset
+        key_stream.hash_array_next = self.hash_array_next
+        return key_stream
+
+
+def iter_password_arrays(
+    password, block_size=None, key_chain=None, prefetch=False, start=0
+):
+    """
+    Returns a KeyStream giving back the password_array for each block in
+    turn, starting at block start. key_chain can be a HashArrayChain other
+    than the shared cached one, or a KeyScheduleIndex.
+    """
+    if block_size is None:
+        block_size = STRING_LENGTH
+    if key_chain is None:
+        key_chain = KEY_SCHEDULE_CACHE.get([p for p in password])
+
+    generation, offset = divmod(start * block_size, len(set_base_hash_array()))
+    return KeyStream(key_chain, block_size, prefetch, generation, offset)
+
+
+def get_prefetch_executor():
+    """
+    Returns the single background thread KeyStream prefetches on, starting it the first time it is needed.
+    """
+    global PREFETCH_EXECUTOR
+
+    with PREFETCH_LOCK:
+        if PREFETCH_EXECUTOR is None:
+            PREFETCH_EXECUTOR = ThreadPoolExecutor(max_workers=1)
+        return PREFETCH_EXECUTOR
 
-        # Once the string array is filled, move into the encoding phase
-        if len(string_array) == STRING_LENGTH:
-
-            # Checks if hash_array has enough characters to meet STRING_LENGTH
-            if len(hash_array) < STRING_LENGTH:
-                # If not, find how many character from the hash_array_next to use
-                next_array_len = STRING_LENGTH - len(hash_array)
-                # Set password_array
-                password_array = hash_array + hash_array_next[:next_array_len]
-                # Reset hash_array from the next one
-                hash_array = hash_array_next
-                # Create a new hash_array_next
-                hash_array_next = set_hash_array(hash_array, password)
-                # Finally, now that hash_array is the old hash_array_next and a
-                # few characters were used, remove those values
-                hash_array = hash_array[next_array_len:]
-            else:
-                # Create the password array
-                password_array = hash_array[:STRING_LENGTH]
-                # Remove those used values from the hash_array
-                hash_array = hash_array[STRING_LENGTH:]
 
+def encode_stream(
+    source, password, block_size=None, key_chain=None, engine=None, prefetch=False
+):
+    """
+    Encodes the source (see iter_chunks()) one block at a time, giving back
+    the encoded text for every STRING_LENGTH characters as soon as it is ready.
+
+    Only one block and the current hash arrays are held in memory, so the
+    source can be as large as needed.
+
+    block_size changes the number of characters in each block, key_chain
+    uses a HashArrayChain other than the shared cached one, and engine picks
+    the engine used for every block (see Cipher). prefetch works out the
+    next hash array in the background (see iter_password_arrays()).
+    """
+    if block_size is None:
+        block_size = STRING_LENGTH
+
+    password = [p for p in password]  # Set the password as an array
+    string_array = []  # To store the current block as an array
+
+    # The password_array for each block, worked out as they are needed
+    password_arrays = iter_password_arrays(password, block_size, key_chain, prefetch)
+
+    for string_array in iter_symbol_blocks(source, block_size):
+        # Once the string array is filled, move into the encoding phase
+        if len(string_array) == block_size:
             # Do the encrypt functions
-            encrypted_string += set_encode(string_array, password_array)
+            yield set_encode(string_array, next(password_arrays), engine, block_size)
             # Reset string_array to empty for the next pass
             string_array = []
 
     # This is for catching the last chunk of string that may not meet STRING_LENGTH requirements
     if string_array != []:
-        # Calls function to pad out the last array to match STRING_LENGTH
-        # Pass hash_array and hash_array_next as one big array to avoice
-        # an array being too small
-        string_array = set_string(string_array, (hash_array + hash_array_next))
-
-        if len(hash_array) < STRING_LENGTH:
-            # If not, find how many character from the hash_array_next to use
-            next_array_len = STRING_LENGTH - len(hash_array)
-            # Set password_array
-            password_array = hash_array + hash_array_next[:next_array_len]
-        else:
-            # Create the password array padded with the hash_array
-            # password_array = password + hash_array[len(password) : STRING_LENGTH]
-            password_array = hash_array[:STRING_LENGTH]
+        password_array = next(password_arrays)
+        # Calls function to pad out the last array to match STRING_LENGTH,
+        # using the rest of the password_array
+        string_array = set_string(string_array, password_array, block_size)
 
-        # Build out the encrypted_string
-        encrypted_string += set_encode(string_array, password_array)
+        yield set_encode(string_array, password_array, engine, block_size)
 
-    return encrypted_string
+
+def encode(string, password):
+    """
+    Main function to encode text.
+
+    Requires a string and a password.
+
+    No length requirements.
+    """
+
+    if INSTRUMENTATION is not None:
+        INSTRUMENTATION.count("encode_calls")
+
+    # Join the encoded blocks together
+    return "".join(encode_stream(string, password))
 
 
 def get_string_binary(string):
@@ -276,11 +1147,10 @@ def get_string_binary(string):
     Takes in an array of characters and converts the values into their binaries.
     Then it returns the string as one long binary.
     """
-    string_binary_array = []
-
-    # Create array of binaries from the string
-    for character in string:
-        string_binary_array.append(get_binary(character))
+    # Create array of binaries from the string, mostly from the lookup table
+    string_binary_array = [
+        SYMBOL_BINARIES.get(character) or get_binary(character) for character in string
+    ]
 
     # Combine those binaries into one long binary
     string_binary = "".join(string_binary_array)
@@ -320,7 +1190,7 @@ def get_password_binaries_array(password):
     return rebuild_binaries
 
 
-def rebuild_binary(string_binary, password_binary):
+def rebuild_binary(string_binary, password_binary, block_size=None):
     """
     Takes an binary string (still encoded), and reverses the binary reduction
     by one step up.
@@ -340,6 +1210,9 @@ def rebuild_binary(string_binary, password_binary):
     by inspecting the second elements of both lists and calculating their next
     values from there.
     """
+    if block_size is None:
+        block_size = STRING_LENGTH
+
     # This will be the new string we build out with binary values
     # Because the password_binary already contains valid numbers,
     # set new_string_binary to those valid numbers
@@ -351,7 +1224,7 @@ def rebuild_binary(string_binary, password_binary):
     # and ends at the calculated total length
     ## (which is STRING_LENGTH * bit size added to the current password_binary length)
     for x in range(
-        (len(password_binary) - 1), (len(password_binary) + (STRING_LENGTH * 8) - 1)
+        (len(password_binary) - 1), (len(password_binary) + (block_size * 8) - 1)
     ):
         # Calculates whether it should return '0' or '1'
         # Store that value for next round iteration
@@ -362,7 +1235,45 @@ def rebuild_binary(string_binary, password_binary):
     return new_string_binary
 
 
-def set_decrypt(string, password, decrypted_string):
+def fast_binary_rebuild(binary_int, password_int, password_length, binary_length):
+    """
+    Does the same job as set_decrypt()'s loop over rebuild_binary(), without
+    building the password triangle.
+
+    Every row of the triangle is the prefix XOR of the row below it, so the
+    top row can be worked out one bit at a time. A string bit s[j] is the
+    reduced bit r[j] XORed with the top row bits k places after it, for every
+    k that is a proper submask of password_length (the same Pascal's triangle
+    mod 2 pattern used by fast_binary_reduction()).
+
+    When password_length is a power of two (256 for the normal decode) and at
+    least binary_length long, that is only k = 0, so the string is simply the
+    reduced binary XORed with the start of the password.
+
+    Returns the password bits followed by the rebuilt string bits as one int.
+    """
+    offsets = get_submasks(password_length)[1:]
+
+    # Every needed top row bit belongs to the password
+    if offsets == [0] and password_length >= binary_length:
+        string_int = binary_int ^ (password_int >> (password_length - binary_length))
+        return (password_int << binary_length) | string_int
+
+    # Otherwise, add one bit at a time onto the end of the top row.
+    # Bit j + k of the row always sits password_length - 1 - k places
+    # from the current end of the row.
+    rebuilt = password_int
+    for j in range(binary_length):
+        bit = (binary_int >> (binary_length - 1 - j)) & 1
+        for k in offsets:
+            bit ^= (rebuilt >> (password_length - 1 - k)) & 1
+        rebuilt = (rebuilt << 1) | bit
+
+    return rebuilt
+
+
+@instrumented("set_decrypt", "blocks_decoded")
+def set_decrypt(string, password, decrypted_string, engine=None, block_size=None):
     """
     Using the string and password, begins rebuilding the decrypted string.
 
@@ -400,16 +1311,51 @@ def set_decrypt(string, password, decrypted_string):
         1 1 0 0     <-encrypted_string
 
     """
+    if block_size is None:
+        block_size = STRING_LENGTH
+
+    # The fast engine works on the symbol codes straight from the lookup table
+    if get_engine(engine) == "fast":
+        string_codes = lookup_symbol_codes(string)
+        password_codes = lookup_symbol_codes(password)
+        if string_codes and password_codes and len(string_codes) >= block_size:
+            binary_int = fast_binary_rebuild(
+                int.from_bytes(string_codes[:block_size], "big"),
+                int.from_bytes(password_codes, "big"),
+                8 * len(password_codes),
+                8 * block_size,
+            )
+            new_string = get_codes_string(
+                binary_int.to_bytes(len(password_codes) + block_size, "big")
+            )
+            # Cut the password back out, leaving only the string
+            return new_string[len("".join(password)) :]
+
     # Get the binary of the string
     string_binary = get_string_binary(string)
 
-    # Get the binary of the password
-    password_binary_tree = get_password_binaries_array(password)
-
-    # This will loop through the range of the found password_binary_tree
-    for step in range(len(password_binary_tree)):
-        # Sends string_binary to function as well as password_binary_tree sent last to first
-        string_binary = rebuild_binary(string_binary, password_binary_tree[(-step) - 1])
+    # The fast engine rebuilds the top row directly without the triangle
+    if get_engine(engine) == "fast":
+        password_binary = get_string_binary(password)
+        binary_int = fast_binary_rebuild(
+            int(string_binary[: 8 * block_size], 2),
+            int(password_binary, 2),
+            len(password_binary),
+            8 * block_size,
+        )
+        string_binary = "{:0{}b}".format(
+            binary_int, len(password_binary) + (8 * block_size)
+        )
+    else:
+        # Get the binary of the password
+        password_binary_tree = get_password_binaries_array(password)
+
+        # This will loop through the range of the found password_binary_tree
+        for step in range(len(password_binary_tree)):
+            # Sends string_binary to function as well as password_binary_tree sent last to first
+            string_binary = rebuild_binary(
+                string_binary, password_binary_tree[(-step) - 1], block_size
+            )
 
     # Convert the found binaries to strings
     new_string = get_string(string_binary)
@@ -422,86 +1368,85 @@ def set_decrypt(string, password, decrypted_string):
     return decrypted_string
 
 
-def decode(string, password):
-    print("Calling decode...")
+def decode_stream(
+    source, password, block_size=None, key_chain=None, engine=None, prefetch=False
+):
+    """
+    Decodes the source (see iter_chunks()) one block at a time, giving back
+    the decoded text as soon as it is ready.
+
+    The ending NULL_STRINGs can only be cut off once the source runs out, so
+    the last STRING_LENGTH + NULL_STRING buffer characters are held back until
+    then. Memory use stays the same no matter how large the source is.
+
+    block_size, key_chain, engine and prefetch work the same as in
+    encode_stream().
+    """
+    if block_size is None:
+        block_size = STRING_LENGTH
 
     password = [p for p in password]  # Set the password as an array
-    decrypted_string = ""  # To hold encrypted text.
-    string_array = []  # To store the string as an array
-    skipped_loop = 0  # For handling the \\x00 character
-
-    # Scrambled hash array to use
-    hash_array = set_hash_array(set_base_hash_array(), password)
-    # Next array to use once the first is empty
-    hash_array_next = set_hash_array(hash_array, password)
-
-    for index, step in enumerate(string):
-        # If a NULL_STRING is found, skip over the individual characters
-        # until the next valid character is reached
-        if skipped_loop > 0:
-            skipped_loop -= 1
-            continue
-
-        if step == chr(92):  # The \ character
-            # Check if string == NULL_STRING
-            if string[index : (index + 4)] == NULL_STRING:
-                string_array.append(NULL_STRING)
-                # Sets number of loops to skip based on NULL_STRING length
-                skipped_loop = len(NULL_STRING) - 1
-            else:
-                string_array.append(step)  # Only the \ character was found
+    string_array = []  # To store the current block as an array
+    held_string = ""  # Decoded text that could still be cut off
 
-        else:
-            string_array.append(step)
+    # Enough characters to cover every ending NULL_STRING check
+    held_length = block_size + ((len(NULL_STRING) - 1) * 3)
 
-        # Once the string array is filled, move into the encoding phase
-        if len(string_array) == STRING_LENGTH:
-            # Checks if hash_array has enough characters to meet STRING_LENGTH
-            if len(hash_array) < STRING_LENGTH:
-                # If not, find how many character from the hash_array_next to use
-                next_array_len = STRING_LENGTH - len(hash_array)
-                # Set password_array
-                # password_array = (
-                #     password + hash_array + hash_array_next[:next_array_len]
-                # )
-                password_array = hash_array + hash_array_next[:next_array_len]
-                # Reset hash_array from the next one
-                hash_array = hash_array_next
-                # Create a new hash_array_next
-                hash_array_next = set_hash_array(hash_array, password)
-                # Finally, now that hash_array is the old hash_array_next and a
-                # few characters were used, remove those values
-                hash_array = hash_array[next_array_len:]
-            else:
-                # Create the password array padded with the hash_array
-                # password_array = password + hash_array[len(password) : STRING_LENGTH]
-                password_array = hash_array[:STRING_LENGTH]
-                # Remove those used values from the hash_array
-                hash_array = hash_array[STRING_LENGTH:]
-
-            # Build out decrptyed_string
-            decrypted_string += set_decrypt(
-                string_array, password_array, decrypted_string
+    # The password_array for each block, worked out as they are needed
+    password_arrays = iter_password_arrays(password, block_size, key_chain, prefetch)
+
+    for string_array in iter_symbol_blocks(source, block_size):
+        # Once the string array is filled, move into the decoding phase
+        if len(string_array) == block_size:
+            held_string += set_decrypt(
+                string_array, next(password_arrays), held_string, engine, block_size
             )
             # Reset string_array to empty
             string_array = []
 
+            # Give back everything that can no longer be cut off
+            if len(held_string) > held_length:
+                yield held_string[:-held_length]
+                held_string = held_string[-held_length:]
+
+    # Cutting the ending NULL_STRINGs only needs the last held_length characters
+    held_string = trim_null_string(held_string, block_size)
+    if held_string:
+        yield held_string
+
+
+def decode(string, password):
+    if INSTRUMENTATION is not None:
+        INSTRUMENTATION.count("decode_calls")
+
+    # Join the decoded blocks together
+    return "".join(decode_stream(string, password))
+
+
+def trim_null_string(decrypted_string, block_size=None):
+    """
+    Cuts the NULL_STRING padding added by set_string() (and anything after it)
+    off the end of the decoded text.
+    """
+    if block_size is None:
+        block_size = STRING_LENGTH
+
     # Max buffer needed to account for NULL_STRING LENGTH
     null_string_buffer = (len(NULL_STRING) - 1) * 3
 
     # If the decrypted_string is long enough, max out buffer size
     # This will get nearly ALL use cases
-    if len(decrypted_string) > STRING_LENGTH + null_string_buffer:
+    if len(decrypted_string) > block_size + null_string_buffer:
         buffer = null_string_buffer
     # Otherwise, calculate how large of a buffer can be used
-    elif len(decrypted_string) > STRING_LENGTH:
-        buffer = len(decrypted_string) - STRING_LENGTH
+    elif len(decrypted_string) > block_size:
+        buffer = len(decrypted_string) - block_size
     # Fail-safe, set buffer to zero if decrypted_string equals STRING_LENGTH
     else:
         buffer = 0
 
     # Slice off the final portion to check for ending NULL_STRINGs in
-    final_string = decrypted_string[-STRING_LENGTH - buffer :]
+    final_string = decrypted_string[-block_size - buffer :]
 
     # Check if 3 NULL_STRINGS in a row are present
     if f"{NULL_STRING + NULL_STRING + NULL_STRING}" in final_string:
@@ -509,7 +1454,7 @@ def decode(string, password):
         # Index against the end of decrypted_string
         f = decrypted_string.rindex(
             f"{NULL_STRING + NULL_STRING + NULL_STRING}",
-            len(decrypted_string) - STRING_LENGTH - buffer,
+            len(decrypted_string) - block_size - buffer,
             len(decrypted_string),
         )
         # Cut off those NULL_STRINGs and everything after
@@ -527,3 +1472,874 @@ def decode(string, password):
         ]
 
     return decrypted_string
+
+
+def get_password_arrays(password, block_count):
+    """
+    Returns the password_array used for each of the first block_count blocks,
+    the same ones encode_stream() and decode_stream() step through.
+
+    """
+    return list(islice(iter_password_arrays(password), block_count))
+
+
+def get_string_arrays(string):
+    """
+    Splits the string into arrays of STRING_LENGTH symbols (see
+    iter_symbols()). The last array may be shorter.
+    """
+    return list(iter_symbol_blocks(string))
+
+
+def encode_batch(blocks, engine=None):
+    """
+    Runs set_encode() over a list of (string_array, password_array) pairs.
+    Used by the parallel workers.
+    """
+    return [set_encode(string, password, engine) for string, password in blocks]
+
+
+def decode_batch(blocks, engine=None):
+    """
+    Runs set_decrypt() over a list of (string_array, password_array) pairs.
+    Used by the parallel workers.
+    """
+    return [set_decrypt(string, password, "", engine) for string, password in blocks]
+
+
+def run_batches(function, blocks, workers, executor, batch_size):
+    """
+    Hands the blocks out to an executor batch_size at a time, and gives back
+    all of the results in their original order.
+
+    executor can be "process", "thread" or an already running Executor (which
+    is left running). Small jobs are just run here without an executor.
+    """
+    engine = get_engine()
+    batches = [blocks[x : (x + batch_size)] for x in range(0, len(blocks), batch_size)]
+
+    # Not worth starting workers for a single batch
+    if len(batches) < 2 or workers == 1:
+        return [result for batch in batches for result in function(batch, engine)]
+
+    if isinstance(executor, Executor):
+        results = executor.map(function, batches, [engine] * len(batches))
+        return [result for batch in results for result in batch]
+
+    if executor == "process":
+        pool = ProcessPoolExecutor(max_workers=workers)
+    elif executor == "thread":
+        pool = ThreadPoolExecutor(max_workers=workers)
+    else:
+        raise ValueError(
+            f"Unknown executor {executor!r}, expected 'process', 'thread' "
+            "or an Executor"
+        )
+
+    with pool:
+        results = pool.map(function, batches, [engine] * len(batches))
+        return [result for batch in results for result in batch]
+
+
+def encode_parallel(
+    string,
+    password,
+    workers=None,
+    executor="process",
+    batch_size=PARALLEL_BATCH_SIZE,
+):
+    """
+    Gives the same result as encode(), but spreads the blocks over a pool of
+    workers (os.cpu_count() of them by default).
+
+    The password_array for every block is worked out first, then the blocks
+    are handed out batch_size at a time and put back together in order.
+    """
+    string_arrays = get_string_arrays(string)
+    password_arrays = get_password_arrays(password, len(string_arrays))
+
+    # Pad out the last array the same way encode_stream() does
+    if string_arrays and len(string_arrays[-1]) < STRING_LENGTH:
+        string_arrays[-1] = set_string(string_arrays[-1], password_arrays[-1])
+
+    encrypted_blocks = run_batches(
+        encode_batch,
+        list(zip(string_arrays, password_arrays)),
+        workers or os.cpu_count(),
+        executor,
+        batch_size,
+    )
+
+    return "".join(encrypted_blocks)
+
+
+def decode_parallel(
+    string,
+    password,
+    workers=None,
+    executor="process",
+    batch_size=PARALLEL_BATCH_SIZE,
+):
+    """
+    Gives the same result as decode(), but spreads the blocks over a pool of
+    workers (os.cpu_count() of them by default).
+    """
+    string_arrays = get_string_arrays(string)
+
+    # Like decode(), a last block that was cut short is left out
+    if string_arrays and len(string_arrays[-1]) < STRING_LENGTH:
+        string_arrays.pop()
+    password_arrays = get_password_arrays(password, len(string_arrays))
+
+    decrypted_blocks = run_batches(
+        decode_batch,
+        list(zip(string_arrays, password_arrays)),
+        workers or os.cpu_count(),
+        executor,
+        batch_size,
+    )
+
+    return trim_null_string("".join(decrypted_blocks))
+
+
+def decode_range(string, password, start, stop=None, index=None):
+    """
+    Decodes only blocks start to stop - 1 (all the way to the end if stop is
+    None) of an encoded string, without decrypting any of the blocks before.
+
+    The earlier blocks still have to be split into symbols to find where the
+    range starts, but their hash arrays are found through a KeyScheduleIndex.
+    Pass the same index back in to reuse its checkpoints on later reads.
+
+    If the range includes the last block, the ending NULL_STRINGs are cut
+    off just like decode() would.
+    """
+    if index is None:
+        index = KeyScheduleIndex(password)
+
+    symbols = iter_symbols(string)
+    # Keep the block before the range, in case the NULL_STRING check needs it
+    first_block = max(start - 1, 0)
+    # Skip past the blocks before that
+    for _ in islice(symbols, first_block * STRING_LENGTH):
+        pass
+
+    decrypted_blocks = []
+    block = first_block
+    while stop is None or block < stop:
+        string_array = list(islice(symbols, STRING_LENGTH))
+        # Like decode(), a last block that was cut short is left out
+        if len(string_array) < STRING_LENGTH:
+            break
+        decrypted_blocks.append(
+            set_decrypt(string_array, index.password_array(block), "")
+        )
+        block += 1
+    else:
+        # Stopped early, so check if the range ended on the last block
+        if len(list(islice(symbols, STRING_LENGTH))) == STRING_LENGTH:
+            return "".join(decrypted_blocks[(start - first_block) :])
+
+    # The range reaches the end, so cut off the ending NULL_STRINGs
+    before = "".join(decrypted_blocks[: (start - first_block)])
+    decrypted_string = trim_null_string("".join(decrypted_blocks))
+    return decrypted_string[len(before) :]
+
+
+class Cipher:
+    """
+    Holds everything worked out from one password, so it can be used for any
+    number of encode() and decode() calls without going back to the raw
+    password each time.
+
+    - block_size is the number of characters in each block (STRING_LENGTH by
+      default). Bigger blocks mean fewer blocks but a longer reduction for
+      each one. It has to be between 1 and the hash array length (128)
+    - engine picks the engine used for every block (see get_engine())
+    - key_chain is a HashArrayChain to use instead of making a new one (for
+      example one loaded by key_store.KeyStore)
+
+    The key schedule chain is made when the Cipher is and kept for its whole
+    life, separate from KEY_SCHEDULE_CACHE. Every call keeps its own place in
+    the chain, so one Cipher can be shared between threads.
+
+    Text encoded with one block_size has to be decoded with the same one.
+    """
+
+    __slots__ = ("password", "block_size", "engine", "key_chain")
+
+    def __init__(self, password, block_size=STRING_LENGTH, engine=None, key_chain=None):
+        hash_array_length = len(set_base_hash_array())
+        if not 1 <= block_size <= hash_array_length:
+            raise ValueError(
+                f"block_size must be between 1 and {hash_array_length}, "
+                f"not {block_size}"
+            )
+
+        self.password = [p for p in password]
+        self.block_size = block_size
+        self.engine = get_engine(engine) if engine is not None else None
+        if key_chain is None:
+            key_chain = HashArrayChain(self.password)
+        self.key_chain = key_chain
+        # Work out the first two generations now, rather than on the first call
+        self.key_chain.generation(1, self.key_chain.generation(0))
+
+    def __repr__(self):
+        return f"Cipher(block_size={self.block_size}, engine={self.engine!r})"
+
+    def encode_stream(self, source):
+        """
+        Same as encode_stream(), using this Cipher's key schedule and settings.
+        """
+        return encode_stream(
+            source, self.password, self.block_size, self.key_chain, self.engine
+        )
+
+    def decode_stream(self, source):
+        """
+        Same as decode_stream(), using this Cipher's key schedule and settings.
+        """
+        return decode_stream(
+            source, self.password, self.block_size, self.key_chain, self.engine
+        )
+
+    def encode(self, string):
+        """
+        Encodes text the same way encode() does.
+        """
+        if INSTRUMENTATION is not None:
+            INSTRUMENTATION.count("encode_calls")
+        return "".join(self.encode_stream(string))
+
+    def decode(self, string):
+        """
+        Decodes text the same way decode() does.
+        """
+        if INSTRUMENTATION is not None:
+            INSTRUMENTATION.count("decode_calls")
+        return "".join(self.decode_stream(string))
+
+
+def get_password_digest(password):
+    """
+    Returns the SHA-256 digest of the password (a string or an array of
+    characters).
+    """
+    return hashlib.sha256("".join(password).encode("utf-8")).digest()
+
+
+class Encoder:
+    """
+    Encodes text a piece at a time, like hashlib: update() gives back the
+    encoded blocks finished by each piece, and finalize() the padded last
+    block. The pieces joined together encode the same as encode() would.
+
+    finalize() does not change the Encoder, so more text can be added after
+    it. state() packs up where the Encoder is (the hash array generation,
+    the offset into it, and the symbols of the unfinished block) into a few
+    hundred bytes, and Encoder.from_state() picks up from there, even in a
+    new process. To keep appending to an encoded file:
+    - Write the update() output, then the finalize() output, and save state()
+    - Next time, cut the old finalize() output off the end of the file, and
+      carry on from the saved state the same way
+
+    The state holds the current hash array, so keep it as private as the
+    password. It also holds the start of the password's digest, so it can
+    only be picked up with the password it was made with.
+    """
+
+    def __init__(self, password):
+        self.password = [p for p in password]  # Set the password as an array
+        # The password_array for each block, from the cached key schedule
+        self.key_stream = iter_password_arrays(self.password)
+        self.string_array = []  # Symbols of the unfinished block
+        self.leftover = ""  # The start of a possible NULL_STRING
+
+    def encode_symbols(self, symbols):
+        """
+        Adds symbols to the unfinished block, encoding every block that gets
+        filled. Returns the encoded text.
+        """
+        if self.string_array:
+            symbols = self.string_array + symbols
+        full_length = len(symbols) - (len(symbols) % STRING_LENGTH)
+
+        # Step through the filled blocks, then keep only the rest
+        encoded = [
+            set_encode(symbols[x : (x + STRING_LENGTH)], next(self.key_stream))
+            for x in range(0, full_length, STRING_LENGTH)
+        ]
+        self.string_array = symbols[full_length:]
+
+        return "".join(encoded)
+
+    def update(self, string):
+        """
+        Adds more text, returning the encoded blocks it finished.
+        """
+        symbols, self.leftover = split_symbols(self.leftover + string)
+        return self.encode_symbols(symbols)
+
+    def finalize(self):
+        """
+        Returns the encoded text still owed for everything added so far: any
+        blocks finished by the held back characters, then the padded last
+        block. The Encoder itself is not changed.
+        """
+        encoder = self.copy()
+        # Nothing else is coming, so these are just normal characters
+        encoded = encoder.encode_symbols(list(encoder.leftover))
+
+        # Pad out the last block the same way encode_stream() does
+        if encoder.string_array:
+            password_array = next(encoder.key_stream)
+            string_array = set_string(encoder.string_array, password_array)
+            encoded += set_encode(string_array, password_array)
+
+        return encoded
+
+    def copy(self):
+        """
+        Returns a separate Encoder at the same place as this one.
+        """
+        encoder = Encoder.__new__(Encoder)
+        encoder.password = self.password
+        encoder.key_stream = self.key_stream.copy()
+        encoder.string_array = list(self.string_array)
+        encoder.leftover = self.leftover
+        return encoder
+
+    def state(self):
+        """
+        Returns where the Encoder is as bytes (see ENCODER_STATE), for
+        from_state() to carry on from.
+        """
+        leftover = self.leftover.encode("ascii")
+        string_codes = get_symbol_codes(self.string_array)
+        key_stream = self.key_stream
+        return (
+            ENCODER_STATE.pack(
+                ENCODER_STATE_VERSION,
+                key_stream.generation,
+                key_stream.offset,
+                len(leftover),
+                len(string_codes),
+                # Only the first 8 bytes fit
+                get_password_digest(self.password),
+            )
+            + get_symbol_codes(key_stream.hash_array)
+            + leftover
+            + string_codes
+        )
+
+    @classmethod
+    def from_state(cls, password, state):
+        """
+        Makes an Encoder for the password that carries on from a state().
+        Raises a ValueError if the state is damaged or was made with a
+        different password.
+        """
+        state = bytes(state)
+        symbols = set_base_hash_array()
+        if len(state) < ENCODER_STATE.size:
+            raise ValueError("Encoder state is too short")
+        version, generation, offset, leftover_length, string_length, digest = (
+            ENCODER_STATE.unpack(state[: ENCODER_STATE.size])
+        )
+        if version != ENCODER_STATE_VERSION:
+            raise ValueError(f"Unknown encoder state version {version}")
+        if not get_password_digest(password).startswith(digest):
+            raise ValueError("Encoder state was made with a different password")
+        if len(state) != (
+            ENCODER_STATE.size + len(symbols) + leftover_length + string_length
+        ):
+            raise ValueError("Encoder state has been cut short or is damaged")
+        if offset > len(symbols) or string_length >= STRING_LENGTH:
+            raise ValueError("Encoder state is damaged")
+
+        position = ENCODER_STATE.size
+        hash_codes = state[position : (position + len(symbols))]
+        position += len(symbols)
+        leftover = bytes(state[position : (position + leftover_length)])
+        string_codes = state[(position + leftover_length) :]
+        if not (hash_codes.isascii() and string_codes.isascii()):
+            raise ValueError("Encoder state is damaged")
+
+        encoder = cls.__new__(cls)
+        encoder.password = [p for p in password]
+        encoder.key_stream = KeyStream(
+            KEY_SCHEDULE_CACHE.get(encoder.password),
+            generation=generation,
+            offset=offset,
+            hash_array=[symbols[code] for code in hash_codes],
+        )
+        encoder.string_array = [symbols[code] for code in string_codes]
+        encoder.leftover = leftover.decode("ascii")
+        return encoder
+
+
+class Decoder:
+    """
+    Decodes text a piece at a time, the other half of Encoder: update() gives
+    back the decoded text that can no longer be cut off, and finalize() the
+    rest, with the ending NULL_STRINGs cut off. The pieces joined together
+    decode the same as decode() would.
+
+    Like decode_stream(), the last STRING_LENGTH + NULL_STRING buffer
+    characters are held back until finalize(), which does not change the
+    Decoder.
+    """
+
+    def __init__(self, password):
+        self.password = [p for p in password]  # Set the password as an array
+        # The password_array for each block, from the cached key schedule
+        self.key_stream = iter_password_arrays(self.password)
+        self.string_array = []  # Symbols of the unfinished block
+        self.leftover = ""  # The start of a possible NULL_STRING
+        self.held_string = ""  # Decoded text that could still be cut off
+
+    def decode_symbols(self, symbols):
+        """
+        Adds symbols to the unfinished block, decoding every block that gets
+        filled. Returns the decoded text that can no longer be cut off.
+        """
+        if self.string_array:
+            symbols = self.string_array + symbols
+        full_length = len(symbols) - (len(symbols) % STRING_LENGTH)
+
+        held_string = self.held_string
+        for x in range(0, full_length, STRING_LENGTH):
+            held_string += set_decrypt(
+                symbols[x : (x + STRING_LENGTH)], next(self.key_stream), held_string
+            )
+        self.string_array = symbols[full_length:]
+
+        # Give back everything that can no longer be cut off
+        held_length = STRING_LENGTH + ((len(NULL_STRING) - 1) * 3)
+        self.held_string = held_string[-held_length:]
+        return held_string[:-held_length] if len(held_string) > held_length else ""
+
+    def update(self, string):
+        """
+        Adds more encoded text, returning the decoded text it finished.
+        """
+        symbols, self.leftover = split_symbols(self.leftover + string)
+        return self.decode_symbols(symbols)
+
+    def finalize(self):
+        """
+        Returns the decoded text still owed for everything added so far, with
+        the ending NULL_STRINGs cut off. A last block that was cut short is
+        left out, like decode() does. The Decoder itself is not changed.
+        """
+        decoder = self.copy()
+        # Nothing else is coming, so these are just normal characters
+        decoded = decoder.decode_symbols(list(decoder.leftover))
+        return decoded + trim_null_string(decoder.held_string)
+
+    def copy(self):
+        """
+        Returns a separate Decoder at the same place as this one.
+        """
+        decoder = Decoder.__new__(Decoder)
+        decoder.password = self.password
+        decoder.key_stream = self.key_stream.copy()
+        decoder.string_array = list(self.string_array)
+        decoder.leftover = self.leftover
+        decoder.held_string = self.held_string
+        return decoder
+
+
+def get_symbol_codes(symbols):
+    """
+    Returns the symbols (characters, or NULL_STRING) as bytes, with the
+    NULL_STRING as 0.
+    """
+    codes = lookup_symbol_codes(symbols)
+    if codes is not None:
+        return codes
+    return bytes(0 if symbol == NULL_STRING else ord(symbol) for symbol in symbols)
+
+
+def iter_key_blocks(password):
+    """
+    Gives back the password_array for each block as bytes.
+    """
+    return map(get_symbol_codes, iter_password_arrays(password))
+
+
+def get_bytes_header(pad_length):
+    """
+    Returns the BYTES_HEADER that starts the encode_bytes() format.
+    """
+    return BYTES_HEADER.pack(BYTES_MAGIC, BYTES_VERSION, STRING_LENGTH, pad_length)
+
+
+def read_bytes_header(data):
+    """
+    Checks the BYTES_HEADER at the start of data and returns the pad length.
+    The data only needs to hold the header.
+    """
+    if len(data) < BYTES_HEADER.size:
+        raise ValueError("Data is too short to have been made by encode_bytes()")
+
+    magic, version, block_size, pad_length = BYTES_HEADER.unpack(
+        bytes(data[: BYTES_HEADER.size])
+    )
+    if magic != BYTES_MAGIC or version != BYTES_VERSION:
+        raise ValueError("Data was not made by encode_bytes()")
+    if block_size != STRING_LENGTH:
+        raise ValueError(f"Data uses a block size of {block_size}, not {STRING_LENGTH}")
+    if pad_length >= STRING_LENGTH:
+        raise ValueError("Data has a damaged header")
+
+    return pad_length
+
+
+def pad_bytes(string_bytes, password_bytes):
+    """
+    Pads out the last block of bytes the same way set_string() does, with 3
+    nulls and then the password bytes.
+    """
+    string_bytes = (bytes(string_bytes) + bytes(3))[:STRING_LENGTH]
+    return string_bytes + password_bytes[len(string_bytes) : STRING_LENGTH]
+
+
+def encode_blocks_bytes(data, key):
+    """
+    Encodes whole blocks of bytes. key holds the password bytes for those
+    blocks joined together (the same length as data).
+    """
+    encrypted = bytearray()
+
+    for x in range(0, len(data), STRING_LENGTH):
+        binary_int = fast_binary_reduction(
+            int.from_bytes(
+                bytes(key[x : (x + STRING_LENGTH)])
+                + bytes(data[x : (x + STRING_LENGTH)]),
+                "big",
+            ),
+            16 * STRING_LENGTH,
+            8 * STRING_LENGTH,
+        )
+        encrypted += binary_int.to_bytes(STRING_LENGTH, "big")
+
+    return bytes(encrypted)
+
+
+def decode_blocks_bytes(data, key):
+    """
+    Decodes whole blocks of bytes made by encode_blocks_bytes() with the
+    same key.
+    """
+    decrypted = bytearray()
+    string_mask = (1 << (8 * STRING_LENGTH)) - 1
+
+    for x in range(0, len(data), STRING_LENGTH):
+        binary_int = fast_binary_rebuild(
+            int.from_bytes(data[x : (x + STRING_LENGTH)], "big"),
+            int.from_bytes(key[x : (x + STRING_LENGTH)], "big"),
+            8 * STRING_LENGTH,
+            8 * STRING_LENGTH,
+        )
+        # Only keep the string half of the rebuilt binary
+        decrypted += (binary_int & string_mask).to_bytes(STRING_LENGTH, "big")
+
+    return bytes(decrypted)
+
+
+def encode_bytes(data, password):
+    """
+    Encodes bytes (or a bytearray/memoryview) into a compact bytes format.
+
+    Every byte is one symbol (0 is the null character), so there is no
+    NULL_STRING escaping and the output is only a BYTES_HEADER longer than the
+    input rounded up to STRING_LENGTH. The header records the block size and
+    how much padding the last block got, in place of the ending NULL_STRINGs.
+
+    The blocks themselves are the same as the encode() output for that text.
+    Only bytes below 128 are supported, like the hash array.
+    """
+    data = bytes(data)
+    if not data.isascii():
+        raise ValueError("encode_bytes() only supports bytes below 128")
+
+    pad_length = -len(data) % STRING_LENGTH
+    key = b"".join(islice(iter_key_blocks(password), len(data) // STRING_LENGTH + 1))
+    key = key[: len(data) + pad_length]
+
+    # Pad out the last block the same way set_string() does
+    if pad_length:
+        last_block = len(data) - (len(data) % STRING_LENGTH)
+        data = data[:last_block] + pad_bytes(data[last_block:], key[last_block:])
+
+    return get_bytes_header(pad_length) + encode_blocks_bytes(data, key)
+
+
+def decode_bytes(data, password):
+    """
+    Decodes the output of encode_bytes() back into the original bytes.
+    """
+    data = memoryview(data).cast("B")
+    pad_length = read_bytes_header(data)
+
+    body = data[BYTES_HEADER.size :]
+    if len(body) % STRING_LENGTH or pad_length > len(body):
+        raise ValueError("Data has been cut short or its header is damaged")
+
+    key = b"".join(islice(iter_key_blocks(password), len(body) // STRING_LENGTH))
+    decrypted = decode_blocks_bytes(body, key)
+
+    # Cut off the padding
+    return decrypted[: len(decrypted) - pad_length]
+
+
+def iter_encoded_bytes(source, password):
+    """
+    Gives back the same text encode() would for the source, as ASCII bytes,
+    one piece (about STREAM_CHUNK_SIZE characters) at a time.
+
+    Each piece of blocks goes through encode_blocks_bytes() in one go, and
+    the encrypted 0 bytes are turned back into NULL_STRINGs, so no block is
+    ever built up as a string.
+    """
+    null_bytes = NULL_STRING.encode("ascii")
+    key_blocks = iter_key_blocks(password)
+    codes = b""  # Symbols (as bytes) not yet making up a whole block
+
+    for symbols in iter_symbol_lists(source):
+        codes += get_symbol_codes(symbols)
+        if not codes.isascii():
+            raise ValueError("Only characters below 128 can be encoded")
+        full_length = len(codes) - (len(codes) % STRING_LENGTH)
+        if full_length:
+            key = b"".join(islice(key_blocks, full_length // STRING_LENGTH))
+            encrypted = encode_blocks_bytes(codes[:full_length], key)
+            yield encrypted.replace(b"\x00", null_bytes)
+        codes = codes[full_length:]
+
+    # Pad out the last block the same way set_string() does
+    if codes:
+        key = next(key_blocks)
+        encrypted = encode_blocks_bytes(pad_bytes(codes, key), key)
+        yield encrypted.replace(b"\x00", null_bytes)
+
+
+def iter_decoded_bytes(source, password):
+    """
+    Gives back the same text decode() would for the source, as ASCII bytes,
+    one piece at a time. Like decode_stream(), the last few characters are
+    held back until the ending NULL_STRINGs can be cut off.
+    """
+    null_bytes = NULL_STRING.encode("ascii")
+    key_blocks = iter_key_blocks(password)
+    codes = b""  # Symbols (as bytes) not yet making up a whole block
+    held_bytes = b""  # Decoded text that could still be cut off
+
+    # Enough characters to cover every ending NULL_STRING check
+    held_length = STRING_LENGTH + ((len(NULL_STRING) - 1) * 3)
+
+    for symbols in iter_symbol_lists(source):
+        codes += get_symbol_codes(symbols)
+        full_length = len(codes) - (len(codes) % STRING_LENGTH)
+        if full_length:
+            key = b"".join(islice(key_blocks, full_length // STRING_LENGTH))
+            decrypted = decode_blocks_bytes(codes[:full_length], key)
+            held_bytes += decrypted.replace(b"\x00", null_bytes)
+        codes = codes[full_length:]
+
+        # Give back everything that can no longer be cut off
+        if len(held_bytes) > held_length:
+            yield held_bytes[:-held_length]
+            held_bytes = held_bytes[-held_length:]
+
+    # Like decode(), a last block that was cut short is left out
+    held_bytes = trim_null_string(held_bytes.decode("ascii")).encode("ascii")
+    if held_bytes:
+        yield held_bytes
+
+
+def get_encoded_length(string, password):
+    """
+    Returns the exact number of characters encode() gives back for the string,
+    to size a buffer for encode_into().
+
+    Which symbols encrypt to a NULL_STRING depends on the key, so this runs
+    the whole bytes encoding and counts the characters. That costs about as
+    much as encode_into() itself; get_encoded_length_bound() is much cheaper
+    when a buffer that is big enough will do (for example one from a pool).
+    """
+    return sum(len(piece) for piece in iter_encoded_bytes(string, password))
+
+
+def get_encoded_length_bound(string):
+    """
+    Returns the most characters encode() can give back for the string, with
+    any password: every symbol of every padded block as a NULL_STRING.
+
+    Only the symbols are counted, nothing is encrypted.
+    """
+    symbol_count = sum(len(symbols) for symbols in iter_symbol_lists(string))
+    block_count = -(-symbol_count // STRING_LENGTH)
+    return block_count * STRING_LENGTH * len(NULL_STRING)
+
+
+def get_decoded_length(string, password):
+    """
+    Returns the exact number of characters decode() gives back for the
+    encoded string, to size a buffer for decode_into().
+    """
+    return sum(len(piece) for piece in iter_decoded_bytes(string, password))
+
+
+def write_pieces(pieces, out, offset=0):
+    """
+    Writes ASCII byte pieces to out, which is either a text file object (any
+    object with a write() method) or a writable buffer such as a bytearray or
+    memoryview (starting at offset). Returns the number of characters
+    written.
+
+    A ValueError is raised as soon as a piece does not fit in a buffer.
+    """
+    written = 0
+
+    if hasattr(out, "write"):
+        for piece in pieces:
+            out.write(piece.decode("ascii"))
+            written += len(piece)
+        return written
+
+    view = memoryview(out).cast("B")
+    for piece in pieces:
+        position = offset + written
+        if position + len(piece) > len(view):
+            raise ValueError(
+                f"Output buffer of {len(view)} bytes is too small "
+                f"(at least {position + len(piece)} are needed)"
+            )
+        view[position : (position + len(piece))] = piece
+        written += len(piece)
+
+    return written
+
+
+def encode_into(source, password, out, offset=0):
+    """
+    Encodes the source (see iter_chunks()) straight into out: a bytearray,
+    memoryview or other writable buffer (starting at offset), or a text file
+    object. Returns the number of characters written.
+
+    The text written is the same as encode() gives back (ASCII, one byte per
+    character in a buffer). get_encoded_length() gives the size needed, and
+    get_encoded_length_bound() a size that is always enough.
+    """
+    return write_pieces(iter_encoded_bytes(source, password), out, offset)
+
+
+def decode_into(source, password, out, offset=0):
+    """
+    Decodes the source straight into out, the same way as encode_into().
+    Returns the number of characters written. get_decoded_length() gives the
+    size needed.
+    """
+    return write_pieces(iter_decoded_bytes(source, password), out, offset)
+
+
+def rekey_stream(source, old_password, new_password):
+    """
+    Gives back the same text as encode(decode(source, old_password),
+    new_password), one piece at a time, without ever holding the whole
+    decoded text.
+
+    Both key schedules are stepped through together. Every block is decoded
+    to its symbol codes with the old password_arrays and encoded again with
+    the new ones straight away (see decode_blocks_bytes() and
+    encode_blocks_bytes()), so it never goes back into text in between.
+
+    Only the last two whole blocks are held back, since the ending
+    NULL_STRINGs are always inside them. Those are decoded, cut down with
+    trim_null_string() and encoded again, padding and all, just like decode()
+    and encode() would.
+    """
+    null_bytes = NULL_STRING.encode("ascii")
+    old_key_blocks = iter_key_blocks(old_password)
+    new_key_blocks = iter_key_blocks(new_password)
+    codes = b""  # Encoded symbols (as bytes) not re-keyed yet
+
+    for symbols in iter_symbol_lists(source):
+        codes += get_symbol_codes(symbols)
+        if not codes.isascii():
+            raise ValueError("Only characters below 128 can be decoded")
+
+        # Re-key every whole block other than the last two
+        ready_length = len(codes) - (len(codes) % STRING_LENGTH) - 2 * STRING_LENGTH
+        if ready_length > 0:
+            block_count = ready_length // STRING_LENGTH
+            decrypted = decode_blocks_bytes(
+                codes[:ready_length],
+                b"".join(islice(old_key_blocks, block_count)),
+            )
+            encrypted = encode_blocks_bytes(
+                decrypted, b"".join(islice(new_key_blocks, block_count))
+            )
+            yield encrypted.replace(b"\x00", null_bytes).decode("ascii")
+            codes = codes[ready_length:]
+
+    # Like decode(), a last block that was cut short is left out
+    full_length = len(codes) - (len(codes) % STRING_LENGTH)
+    decrypted = decode_blocks_bytes(
+        codes[:full_length],
+        b"".join(islice(old_key_blocks, full_length // STRING_LENGTH)),
+    )
+    decrypted_string = trim_null_string(get_codes_string(decrypted))
+
+    # Encode the ending again, padding out its last block like encode()
+    codes = get_symbol_codes(iter_symbols(decrypted_string))
+    encrypted = []
+    for x in range(0, len(codes), STRING_LENGTH):
+        key = next(new_key_blocks)
+        encrypted.append(
+            encode_blocks_bytes(pad_bytes(codes[x : (x + STRING_LENGTH)], key), key)
+        )
+    if encrypted:
+        yield b"".join(encrypted).replace(b"\x00", null_bytes).decode("ascii")
+
+
+def rekey(string, old_password, new_password):
+    """
+    Changes the password of encoded text: gives the same result as
+    encode(decode(string, old_password), new_password) in a single pass.
+    """
+    return "".join(rekey_stream(string, old_password, new_password))
+
+
+def rekey_batch(items, engine=None):
+    """
+    Runs rekey() over a list of (string, old_password, new_password) items.
+    Used by the parallel workers (the engine is not needed, since rekey()
+    always works on the symbol codes).
+    """
+    return [rekey(string, old, new) for string, old, new in items]
+
+
+def rekey_many(
+    strings,
+    old_password,
+    new_password,
+    workers=None,
+    executor="process",
+    batch_size=8,
+):
+    """
+    Re-keys a list of encoded strings (see rekey()), spread over a pool of
+    workers (os.cpu_count() of them by default), batch_size strings at a
+    time. The results come back in the same order.
+    """
+    return run_batches(
+        rekey_batch,
+        [(string, old_password, new_password) for string in strings],
+        workers or os.cpu_count(),
+        executor,
+        batch_size,
+    )
@@ -0,0 +1,281 @@
+"""
+On-disk store of worked out hash array generations, so a new process can
+start encoding and decoding without running set_hash_array() again.
+
+    from key_store import KeyStore
+
+    store = KeyStore("keys")
+    store.save("password")      # or: python -m key_store keys -p password
+    store.preload(["password"])  # encode()/decode() now skip the key schedule
+
+Each password gets one file, named after the SHA-256 digest of the password:
+
+    KEY_STORE_HEADER  magic, version, hash array length, generation count,
+                      CRC-32 of the generations, password digest
+    generations       hash array length bytes for each generation, one byte
+                      per symbol (see get_symbol_codes())
+
+Files are memory mapped and the generations are read straight out of the map
+as they are asked for. The stored generations ARE the key stream, so the
+store should be kept as private as the passwords themselves.
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import zlib
+
+from encode_v2 import (
+    KEY_CACHE_GENERATIONS,
+    KEY_SCHEDULE_CACHE,
+    HashArrayChain,
+    get_password_digest,
+    get_symbol_codes,
+    set_base_hash_array,
+)
+
+KEY_STORE_MAGIC = b"BREK"
+KEY_STORE_VERSION = 1
+# magic, version, hash array length, generation count, CRC-32, password digest
+KEY_STORE_HEADER = struct.Struct(">4sBHHI32s")
+# Most generations the header can record
+KEY_STORE_MAX_GENERATIONS = 2**16 - 1
+# File name ending for stored passwords
+KEY_STORE_SUFFIX = ".brk"
+# Environment variable the password can be given in
+PASSWORD_ENV = "BRE_PASSWORD"
+
+
+class StoredHashArrayChain(HashArrayChain):
+    """
+    A HashArrayChain whose first generations come from a KeyStore file instead
+    of set_hash_array(). Generations past the stored ones are worked out as
+    normal.
+    """
+
+    def __init__(self, password, data, stored_generations):
+        super().__init__(password, max(stored_generations, KEY_CACHE_GENERATIONS))
+        self.data = data
+        self.stored_generations = stored_generations
+        self.symbols = set_base_hash_array()
+
+    def generation(self, number, previous=None):
+        """
+        Returns hash array generation `number`, reading it from the store if it
+        is there.
+        """
+        with self.lock:
+            array_length = len(self.symbols)
+            while len(self.generations) <= min(number, self.stored_generations - 1):
+                start = KEY_STORE_HEADER.size + len(self.generations) * array_length
+                self.generations.append(
+                    [
+                        self.symbols[code]
+                        for code in self.data[start : (start + array_length)]
+                    ]
+                )
+
+        return super().generation(number, previous)
+
+
+class KeyStore:
+    """
+    A directory of stored key schedules, one file per password.
+
+    - generations is how many hash arrays to store for each password
+      (every block of 128 / STRING_LENGTH uses one of them)
+    - Loaded chains are kept, so each file is only mapped once
+    """
+
+    def __init__(self, directory, generations=KEY_CACHE_GENERATIONS):
+        self.directory = directory
+        self.generations = generations
+        self.chains = {}
+        self.lock = threading.Lock()
+
+    def path(self, password):
+        """
+        Returns the file the password is stored in.
+        """
+        return os.path.join(
+            self.directory, get_password_digest(password).hex() + KEY_STORE_SUFFIX
+        )
+
+    def save(self, password, generations=None):
+        """
+        Works out the hash array generations for the password and writes them
+        to its file. Returns the path written.
+
+        The file is written under a temporary name first, so a process
+        reading the store never sees half of one. Raises a ValueError if
+        generations is not between 1 and KEY_STORE_MAX_GENERATIONS.
+        """
+        if generations is None:
+            generations = self.generations
+        if not 1 <= generations <= KEY_STORE_MAX_GENERATIONS:
+            raise ValueError(
+                f"generations must be between 1 and {KEY_STORE_MAX_GENERATIONS}, "
+                f"not {generations}"
+            )
+
+        chain = HashArrayChain(password, generations)
+        hash_array = None
+        body = []
+        for number in range(generations):
+            hash_array = chain.generation(number, hash_array)
+            body.append(get_symbol_codes(hash_array))
+        body = b"".join(body)
+
+        header = KEY_STORE_HEADER.pack(
+            KEY_STORE_MAGIC,
+            KEY_STORE_VERSION,
+            len(set_base_hash_array()),
+            generations,
+            zlib.crc32(body),
+            get_password_digest(password),
+        )
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(password)
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=self.directory)
+        try:
+            with os.fdopen(file_descriptor, "wb") as file:
+                file.write(header + body)
+            os.replace(temporary_path, path)
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+
+        return path
+
+    def load(self, password):
+        """
+        Maps the password's file and returns a StoredHashArrayChain for it, or
+        None if the password has not been stored.
+
+        Raises a ValueError if the file is damaged or was made for something
+        else.
+        """
+        key = tuple(password)
+        with self.lock:
+            chain = self.chains.get(key)
+        if chain is not None:
+            return chain
+
+        try:
+            file = open(self.path(password), "rb")
+        except FileNotFoundError:
+            return None
+        with file:
+            size = os.fstat(file.fileno()).st_size
+            if size < KEY_STORE_HEADER.size:
+                raise ValueError(f"{file.name} is too short to be a key store file")
+            data = mmap.mmap(file.fileno(), size, access=mmap.ACCESS_READ)
+
+        try:
+            generations = read_key_store_header(data, password)
+        except ValueError:
+            data.close()
+            raise
+
+        chain = StoredHashArrayChain(password, data, generations)
+        with self.lock:
+            return self.chains.setdefault(key, chain)
+
+    def get(self, password):
+        """
+        Returns the stored chain for the password, saving it first if it is
+        missing or damaged.
+        """
+        try:
+            chain = self.load(password)
+        except ValueError:
+            chain = None
+        if chain is None:
+            self.save(password)
+            chain = self.load(password)
+
+        return chain
+
+    def preload(self, passwords):
+        """
+        Puts the stored chain of every password into KEY_SCHEDULE_CACHE, so
+        encode() and decode() start using them straight away.
+        """
+        for password in passwords:
+            KEY_SCHEDULE_CACHE.put(password, self.get(password))
+
+
+def read_key_store_header(data, password):
+    """
+    Checks the KEY_STORE_HEADER and CRC-32 of a mapped key store file.
+    Returns the number of stored generations.
+    """
+    magic, version, array_length, generations, checksum, digest = (
+        KEY_STORE_HEADER.unpack(data[: KEY_STORE_HEADER.size])
+    )
+    if magic != KEY_STORE_MAGIC or version != KEY_STORE_VERSION:
+        raise ValueError("Not a key store file, or made by a different version")
+    if array_length != len(set_base_hash_array()):
+        raise ValueError(f"Key store uses a hash array length of {array_length}")
+    if digest != get_password_digest(password):
+        raise ValueError("Key store file is for a different password")
+    if len(data) != KEY_STORE_HEADER.size + generations * array_length:
+        raise ValueError("Key store file has been cut short")
+    if zlib.crc32(data[KEY_STORE_HEADER.size :]) != checksum:
+        raise ValueError("Key store file is damaged")
+
+    return generations
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m key_store",
+        description="Prewarm a key store so workers can skip the key schedule.",
+    )
+    parser.add_argument("directory", help="key store directory")
+    parser.add_argument(
+        "-p",
+        "--password",
+        action="append",
+        default=[],
+        help=f"password to store (can be repeated, defaults to ${PASSWORD_ENV})",
+    )
+    parser.add_argument(
+        "--password-file", help="file with one password to store on each line"
+    )
+    parser.add_argument(
+        "-g",
+        "--generations",
+        type=int,
+        default=KEY_CACHE_GENERATIONS,
+        help=f"hash arrays to store per password (default {KEY_CACHE_GENERATIONS})",
+    )
+    args = parser.parse_args(argv)
+
+    passwords = list(args.password)
+    if args.password_file:
+        with open(args.password_file) as file:
+            passwords += [line.rstrip("\r\n") for line in file if line.rstrip("\r\n")]
+    if not passwords and PASSWORD_ENV in os.environ:
+        passwords.append(os.environ[PASSWORD_ENV])
+    if not passwords:
+        parser.error(f"no passwords given (use -p, --password-file or ${PASSWORD_ENV})")
+    if not 1 <= args.generations <= KEY_STORE_MAX_GENERATIONS:
+        parser.error(f"--generations must be between 1 and {KEY_STORE_MAX_GENERATIONS}")
+
+    store = KeyStore(args.directory, args.generations)
+    try:
+        for password in passwords:
+            print(store.save(password))
+    except ValueError as error:
+        parser.error(str(error))
+    except OSError as error:
+        parser.exit(1, f"{parser.prog}: error: {error}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,645 @@
+"""
+Checks that the fast engine gives exactly the same results as the reference
+engine, and that everything built on top of it round trips.
+
+Run with: python -m pytest
+"""
+
+import asyncio
+import io
+import random
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+
+import pytest
+
+import encode_cli
+import encode_v2
+from encode_async import decode_stream_async, encode_async, encode_stream_async
+from encode_v2 import (
+    NULL_STRING,
+    decode,
+    encode,
+    set_base_hash_array,
+    set_decrypt,
+    set_encode,
+    set_hash_array,
+)
+from key_store import KeyStore
+from key_store import main as key_store_main
+
+# Characters that can be typed into a password
+PASSWORD_CHARACTERS = [chr(x) for x in range(33, 127)]
+# Symbols that can be in a message, including the ones near NULL_STRING
+MESSAGE_SYMBOLS = [chr(x) for x in range(1, 128)] + [NULL_STRING, "\\x0", "\\"]
+
+
+def get_password(random_generator, length=None):
+    """
+    Returns a random password, between 1 and 40 characters unless a length
+    is given.
+    """
+    if length is None:
+        length = random_generator.randint(1, 40)
+    return "".join(random_generator.choice(PASSWORD_CHARACTERS) for _ in range(length))
+
+
+def get_message(random_generator, length):
+    """
+    Returns a random message made up of length MESSAGE_SYMBOLS.
+    """
+    return "".join(random_generator.choice(MESSAGE_SYMBOLS) for _ in range(length))
+
+
+def get_block(random_generator, length):
+    """
+    Returns a random array of length symbols, as set_encode() takes them.
+    """
+    return [random_generator.choice(set_base_hash_array()) for _ in range(length)]
+
+
+@pytest.mark.parametrize("length", [1, 5, 16, 17, 32, 64])
+def test_set_hash_array_engines_match(length):
+    random_generator = random.Random(length)
+    for _ in range(5):
+        password = list(get_password(random_generator, length))
+        hash_array = set_base_hash_array()
+        random_generator.shuffle(hash_array)
+        assert set_hash_array(list(hash_array), password, "fast") == set_hash_array(
+            list(hash_array), password, "reference"
+        )
+
+
+@pytest.mark.parametrize("block_size", [1, 3, 8, 32])
+def test_set_encode_engines_match(block_size):
+    random_generator = random.Random(block_size)
+    for _ in range(4):
+        string = get_block(random_generator, block_size)
+        password = get_block(random_generator, block_size)
+        assert set_encode(string, password, "fast", block_size) == set_encode(
+            string, password, "reference", block_size
+        )
+
+
+@pytest.mark.parametrize("block_size", [1, 3, 8, 32])
+def test_set_decrypt_engines_match(block_size):
+    random_generator = random.Random(block_size)
+    for _ in range(4):
+        string = get_block(random_generator, block_size)
+        password = get_block(random_generator, block_size)
+        assert set_decrypt(string, password, "", "fast", block_size) == set_decrypt(
+            string, password, "", "reference", block_size
+        )
+
+
+@pytest.mark.parametrize("block_size", [3, 8, 32])
+def test_set_decrypt_reverses_set_encode(block_size):
+    random_generator = random.Random(block_size)
+    for engine in encode_v2.ENGINES:
+        string = get_block(random_generator, block_size)
+        password = get_block(random_generator, block_size)
+        encrypted = list(set_encode(string, password, engine, block_size))
+        assert set_decrypt(encrypted, password, "", engine, block_size) == "".join(
+            string
+        )
+
+
+@pytest.mark.parametrize("length", [0, 1, 28, 32, 33, 100, 1000])
+def test_encode_decode_round_trip(length):
+    random_generator = random.Random(length)
+    password = get_password(random_generator)
+    message = get_message(random_generator, length)
+    encrypted = encode(message, password)
+    # The ending NULL_STRING padding isn't always cut off completely (when a
+    # block is too full for all 3, or the hash padding starts with one), so
+    # only the start has to match
+    assert decode(encrypted, password).startswith(message)
+
+
+def test_encode_same_for_both_engines(monkeypatch):
+    random_generator = random.Random(1)
+    password = get_password(random_generator)
+    message = get_message(random_generator, 70)
+    encrypted = encode(message, password)
+    decrypted = decode(encrypted, password)
+    monkeypatch.setattr(encode_v2, "ENGINE", "reference")
+    assert encode(message, password) == encrypted
+    assert decode(encrypted, password) == decrypted
+
+
+def test_key_schedule_cache_drops_permutations():
+    cache = encode_v2.KeyScheduleCache(maxsize=2)
+    chain = cache.get("password")
+    first = chain.generation(3)
+    assert chain.permutations
+    assert cache.invalidate("password")
+    assert cache.get("password") is not chain
+    assert cache.get("password").permutations == {}
+    assert cache.get("password").generation(3) == first
+    cache.resize(0)
+    assert cache.stats()["size"] == 0
+
+    # Least recently used order, and the counters
+    cache = encode_v2.KeyScheduleCache(maxsize=2)
+    chain_a = cache.get("a")
+    chain_b = cache.get("b")
+    assert cache.get("a") is chain_a
+    cache.get("c")
+    assert list(cache.chains) == [("a",), ("c",)]
+    assert cache.stats() == {
+        "hits": 1,
+        "misses": 3,
+        "evictions": 1,
+        "size": 2,
+        "maxsize": 2,
+    }
+    assert cache.get("b") is not chain_b
+    cache.clear()
+    assert cache.stats()["hits"] == cache.stats()["size"] == 0
+
+
+def test_key_schedule_walkers_match():
+    key_chain = encode_v2.KEY_SCHEDULE_CACHE.get(list("walkers"))
+    hash_arrays = [key_chain.generation(x) for x in range(12)]
+    key_stream = sum(hash_arrays, [])
+    blocks = [key_stream[x : (x + 32)] for x in range(0, len(key_stream), 32)]
+
+    assert encode_v2.get_password_arrays("walkers", len(blocks)) == blocks
+    key_blocks = encode_v2.iter_key_blocks("walkers")
+    assert [next(key_blocks) for _ in blocks] == list(
+        map(encode_v2.get_symbol_codes, blocks)
+    )
+    index = encode_v2.KeyScheduleIndex("walkers", checkpoint_interval=4)
+    for block in [0, 3, 4, 30, 47, 5, 19]:
+        assert index.password_array(block) == blocks[block]
+    assert index.key_bytes(6, 20) == b"".join(
+        map(encode_v2.get_symbol_codes, blocks[6:26])
+    )
+    for block_size in [5, 32, 128]:
+        password_arrays = encode_v2.iter_password_arrays(
+            "walkers", block_size, prefetch=True, start=3
+        )
+        for x in range(3, len(key_stream) // block_size):
+            assert (
+                next(password_arrays)
+                == key_stream[(x * block_size) : ((x + 1) * block_size)]
+            )
+
+
+def test_encrypt_file_output_onto_source(tmp_path):
+    data = bytes(range(1, 128)) * 20 + b"end"
+    path = tmp_path / "notes.txt"
+    path.write_bytes(data)
+
+    encode_cli.encrypt_file(str(path), "password", str(tmp_path / "." / "notes.txt"))
+    assert path.read_bytes() == encode_v2.encode_bytes(data, "password")
+    encode_cli.decrypt_file(str(path), "password", str(path))
+    assert path.read_bytes() == data
+
+
+def test_key_schedule_index_checkpoints_stay_bounded():
+    key_blocks = encode_v2.iter_key_blocks("password")
+    key = [next(key_blocks) for _ in range(2000)]
+    index = encode_v2.KeyScheduleIndex("password", max_checkpoints=6)
+    for block in [1999, 7, 1200, 1998, 0, 640]:
+        assert index.key_bytes(block) == key[block]
+        assert len(index.checkpoints) <= 6
+        assert all(len(codes) == 128 for codes in index.checkpoints.values())
+    index.drop_checkpoints(100)
+    assert max(index.checkpoints) <= 100
+    assert index.key_bytes(1500, 3) == b"".join(key[1500:1503])
+
+
+@pytest.mark.parametrize("length", [0, 31, 32, 5000])
+def test_encrypt_decrypt_file(tmp_path, length):
+    data = bytes(random.Random(length).randrange(1, 128) for _ in range(length))
+    encrypted = encode_v2.encode_bytes(data, "password")
+    path = tmp_path / "notes.txt"
+    for destination in [None, str(tmp_path / "notes.bre")]:
+        path.write_bytes(data)
+        encode_cli.encrypt_file(str(path), "password", destination, window_blocks=3)
+        output = path if destination is None else tmp_path / "notes.bre"
+        assert output.read_bytes() == encrypted
+        encode_cli.decrypt_file(str(output), "password", None, window_blocks=3)
+        assert output.read_bytes() == data
+
+
+@pytest.mark.parametrize("piece_length", [1, 7, 32, 100, 5000])
+def test_encoder_pieces_match_encode(piece_length):
+    random_generator = random.Random(piece_length)
+    message = get_message(random_generator, 3000)
+    encoder = encode_v2.Encoder("password")
+    encoded = [
+        encoder.update(message[x : (x + piece_length)])
+        for x in range(0, len(message), piece_length)
+    ]
+    assert "".join(encoded) + encoder.finalize() == encode(message, "password")
+
+
+def test_encoder_state_resumes():
+    random_generator = random.Random(2)
+    message = get_message(random_generator, 1500)
+    for split in [0, 1, 127, 128, 129, 512, 1500]:
+        encoder = encode_v2.Encoder("password")
+        encoded = encoder.update(message[:split])
+        resumed = encode_v2.Encoder.from_state("password", encoder.state())
+        encoded += resumed.update(message[split:]) + resumed.finalize()
+        assert encoded == encode(message, "password")
+    with pytest.raises(ValueError):
+        encode_v2.Encoder.from_state("password", encoder.state()[:-1])
+    with pytest.raises(ValueError, match="different password"):
+        encode_v2.Encoder.from_state("passworc", encoder.state())
+
+
+def test_decoder_pieces_match_decode():
+    random_generator = random.Random(3)
+    message = get_message(random_generator, 2000)
+    encrypted = encode(message, "password")
+    decoder = encode_v2.Decoder("password")
+    decoded = [
+        decoder.update(encrypted[x : (x + 45)]) for x in range(0, len(encrypted), 45)
+    ]
+    assert "".join(decoded) + decoder.finalize() == decode(encrypted, "password")
+
+
+class BufferWriter:
+    """
+    Stands in for an asyncio.StreamWriter, keeping everything written.
+    """
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+
+def test_stream_async_idle_streams_leave_executor_free():
+    async def run():
+        # More idle streams than the executor has slots
+        readers = [asyncio.StreamReader() for _ in range(8)]
+        writers = [BufferWriter() for _ in readers]
+        streams = [
+            asyncio.create_task(encode_stream_async(reader, writer, "password"))
+            for reader, writer in zip(readers, writers)
+        ]
+        await asyncio.sleep(0.01)
+        encrypted = await asyncio.wait_for(encode_async("text", "password"), 10)
+        assert encrypted == encode("text", "password")
+
+        message = get_message(random.Random(4), 500)
+        for reader in readers:
+            reader.feed_data(message.encode("utf-8"))
+            reader.feed_eof()
+        await asyncio.wait_for(asyncio.gather(*streams), 10)
+        for writer in writers:
+            assert writer.data.decode("utf-8") == encode(message, "password")
+
+        reader, writer = asyncio.StreamReader(), BufferWriter()
+        reader.feed_data(encode(message, "password").encode("utf-8"))
+        reader.feed_eof()
+        await decode_stream_async(reader, writer, "password", chunk_size=7)
+        assert writer.data.decode("utf-8") == decode(
+            encode(message, "password"), "password"
+        )
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("length", [0, 1, 32, 33, 700])
+def test_encode_into_and_lengths(length):
+    message = get_message(random.Random(length), length)
+    encrypted = encode(message, "password")
+    decrypted = decode(encrypted, "password")
+    assert encode_v2.get_encoded_length(message, "password") == len(encrypted)
+    assert encode_v2.get_decoded_length(encrypted, "password") == len(decrypted)
+
+    bound = encode_v2.get_encoded_length_bound(message)
+    assert bound >= len(encrypted)
+    block_count = len(encode_v2.get_string_arrays(message))
+    assert bound == block_count * 32 * len(NULL_STRING)
+    buffer = bytearray(bound + 2)
+    written = encode_v2.encode_into(message, "password", buffer, 2)
+    assert buffer[2 : (2 + written)].decode("ascii") == encrypted
+
+    buffer = bytearray(len(decrypted))
+    assert encode_v2.decode_into(encrypted, "password", buffer) == len(decrypted)
+    assert buffer.decode("ascii") == decrypted
+    if encrypted:
+        with pytest.raises(ValueError):
+            encode_v2.encode_into(message, "password", bytearray(len(encrypted) - 1))
+
+
+@pytest.mark.parametrize("block_size", [1, 7, 32, 128])
+def test_streams_match_for_any_source(block_size):
+    random_generator = random.Random(block_size)
+    message = get_message(random_generator, 900)
+    password = get_password(random_generator)
+
+    def encode_all(source):
+        return "".join(encode_v2.encode_stream(source, password, block_size))
+
+    def decode_all(source):
+        return "".join(encode_v2.decode_stream(source, password, block_size))
+
+    encrypted = encode_all(message)
+    pieces = [message[x : (x + 50)] for x in range(0, len(message), 50)]
+    assert encode_all(pieces) == encrypted
+    assert encode_all(io.StringIO(message)) == encrypted
+
+    decrypted = decode_all(encrypted)
+    assert decrypted.startswith(message)
+    pieces = [encrypted[x : (x + 50)] for x in range(0, len(encrypted), 50)]
+    assert decode_all(iter(pieces)) == decrypted
+    if block_size == 32:
+        assert encrypted == encode(message, password)
+        assert decrypted == decode(encrypted, password)
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_parallel_matches_encode(executor):
+    message = get_message(random.Random(6), 1000)
+    encrypted = encode(message, "password")
+    assert (
+        encode_v2.encode_parallel(message, "password", 2, executor, batch_size=3)
+        == encrypted
+    )
+    assert encode_v2.decode_parallel(
+        encrypted, "password", 2, executor, batch_size=3
+    ) == decode(encrypted, "password")
+
+
+def test_decode_range_matches_decode():
+    # No NULL_STRINGs in the message, so every block decodes to 32 characters
+    random_generator = random.Random(7)
+    message = "".join(random_generator.choice(PASSWORD_CHARACTERS) for _ in range(700))
+    encrypted = encode(message, "password")
+    decrypted = decode(encrypted, "password")
+    block_count = len(encode_v2.get_string_arrays(encrypted))
+    index = encode_v2.KeyScheduleIndex("password")
+    for start, stop in [(0, 1), (3, 9), (5, None), (block_count - 1, None)]:
+        decoded = encode_v2.decode_range(encrypted, "password", start, stop, index)
+        assert decoded == decrypted[(start * 32) : (stop and stop * 32)]
+
+
+@pytest.mark.parametrize("length", [0, 1, 31, 32, 33, 500])
+def test_encode_bytes_round_trip(length):
+    data = bytes(random.Random(length).randrange(0, 128) for _ in range(length))
+    encrypted = encode_v2.encode_bytes(data, "password")
+    assert len(encrypted) == encode_v2.BYTES_HEADER.size + -(-length // 32) * 32
+    assert encode_v2.decode_bytes(encrypted, "password") == data
+    assert encode_v2.decode_bytes(bytearray(encrypted), "password") == data
+    if length:
+        with pytest.raises(ValueError):
+            encode_v2.decode_bytes(encrypted[:-1], "password")
+
+
+def test_encode_bytes_blocks_match_encode():
+    text = "".join(random.Random(8).choice(PASSWORD_CHARACTERS) for _ in range(320))
+    encrypted = encode_v2.encode_bytes(text.encode("ascii"), "password")
+    body = encrypted[encode_v2.BYTES_HEADER.size :]
+    assert encode_v2.get_codes_string(body) == encode(text, "password")
+
+
+@pytest.mark.parametrize("length", [0, 1, 29, 32, 64, 65, 1000])
+def test_rekey_matches_decode_then_encode(length):
+    message = get_message(random.Random(length), length)
+    encrypted = encode(message, "old password")
+    expected = encode(decode(encrypted, "old password"), "new password")
+    assert encode_v2.rekey(encrypted, "old password", "new password") == expected
+
+
+def test_rekey_many_keeps_order():
+    messages = [get_message(random.Random(x), 40 * x) for x in range(6)]
+    encrypted = [encode(message, "old") for message in messages]
+    expected = [encode(decode(string, "old"), "new") for string in encrypted]
+    assert encode_v2.rekey_many(encrypted, "old", "new", 2, "thread", 2) == expected
+
+
+def test_key_store_chain_matches_derived(tmp_path):
+    store = KeyStore(str(tmp_path), generations=5)
+    store.save("password")
+    chain = store.load("password")
+    derived = encode_v2.HashArrayChain("password")
+    for number in range(8):
+        assert chain.generation(number) == derived.generation(number)
+
+    path = store.path("password")
+    with open(path, "r+b") as file:
+        file.seek(-1, 2)
+        last = file.read(1)[0]
+        file.seek(-1, 2)
+        file.write(bytes([last ^ 1]))
+    with pytest.raises(ValueError):
+        KeyStore(str(tmp_path)).load("password")
+
+
+def test_numpy_batch_matches_encode_and_decode():
+    encode_numpy = pytest.importorskip("encode_numpy")
+    random_generator = random.Random(10)
+    lengths = [0, 1, 29, 30, 31, 32, 33, 64, 100, 333]
+    messages = [get_message(random_generator, length) for length in lengths]
+    messages += [
+        NULL_STRING * 3,
+        "ends with \\x0",
+        "ends with \\",
+        "null " + chr(0) + " character",
+        "\\\\x00" * 20,
+    ]
+    for password in ["p", "a longer password!"]:
+        encrypted = encode_numpy.encode_many(messages, password)
+        assert encrypted == [encode(message, password) for message in messages]
+        assert encode_numpy.decode_many(encrypted, password) == [
+            decode(string, password) for string in encrypted
+        ]
+
+    # Characters past the first 128 go through the one at a time fallback
+    encoded_text = "abc" * 11 + "é"
+    assert encode_numpy.decode_many([encoded_text, "é"], "password") == [
+        decode(encoded_text, "password"),
+        decode("é", "password"),
+    ]
+    with pytest.raises(UnicodeDecodeError):
+        encode("héllo", "password")
+    with pytest.raises(UnicodeDecodeError):
+        encode_numpy.encode_many(["hi", "héllo"], "password")
+
+
+def test_instrument_counts_encode_and_decode():
+    password = "instrumented password"
+    message = "a" * 100 + NULL_STRING + "b" * 100 + NULL_STRING  # 202 symbols
+    encode_v2.KEY_SCHEDULE_CACHE.invalidate(password)
+    events = []
+
+    with encode_v2.instrument() as metrics:
+        metrics.add_observer(lambda name, value: events.append(name))
+        encrypted = encode(message, password)
+        cold = metrics.snapshot()["counters"]
+        metrics.reset()
+        decode(encrypted, password)
+        warm = metrics.snapshot()["counters"]
+    assert encode_v2.INSTRUMENTATION is None
+
+    # 7 blocks use 224 hash characters, so the first 2 generations
+    assert cold["encode_calls"] == 1
+    assert cold["blocks_encoded"] == 7
+    assert cold["null_string_hits"] == 2
+    assert cold["key_schedule_derivations"] == 2
+    assert cold["hash_array_regenerations"] == 1
+    assert warm["decode_calls"] == 1
+    assert warm["blocks_decoded"] == 7
+    assert warm["hash_array_regenerations"] == 1
+    assert "key_schedule_derivations" not in warm
+    assert metrics.snapshot()["timers"]["set_decrypt"]["calls"] == 7
+    for name in ["encode_calls", "set_encode", "set_hash_array", "decode_calls"]:
+        assert name in events
+
+    # Nested blocks put back the instrumentation that was in use before
+    outer = encode_v2.enable_instrumentation()
+    try:
+        with encode_v2.instrument():
+            encode("x", password)
+        assert encode_v2.INSTRUMENTATION is outer
+        assert "encode_calls" not in outer.counters
+    finally:
+        encode_v2.disable_instrumentation()
+    assert encode_v2.INSTRUMENTATION is None
+
+
+def test_cipher_block_sizes():
+    for block_size in [1, 128]:
+        assert encode_v2.Cipher("password", block_size).block_size == block_size
+    for block_size in [0, 129]:
+        with pytest.raises(ValueError):
+            encode_v2.Cipher("password", block_size)
+
+    message = get_message(random.Random(11), 300)
+    cipher = encode_v2.Cipher("password")
+    assert cipher.encode(message) == encode(message, "password")
+    assert cipher.decode(cipher.encode(message)) == decode(
+        encode(message, "password"), "password"
+    )
+
+
+@pytest.mark.parametrize("block_size", [1, 5, 17, 100, 128])
+def test_cipher_round_trip(block_size):
+    message = get_message(random.Random(block_size), 400)
+    encrypted = encode_v2.Cipher("password", block_size).encode(message)
+    assert (
+        encode_v2.Cipher("password", block_size).decode(encrypted).startswith(message)
+    )
+    if block_size != 32:
+        assert encrypted != encode(message, "password")
+
+
+def test_cipher_shared_between_threads():
+    random_generator = random.Random(12)
+    messages = [get_message(random_generator, 50 * x) for x in range(1, 25)]
+    expected = [encode_v2.Cipher("password", 7).encode(m) for m in messages]
+
+    cipher = encode_v2.Cipher("password", 7)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        encrypted = list(pool.map(cipher.encode, messages))
+        decrypted = list(pool.map(cipher.decode, encrypted))
+    assert encrypted == expected
+    for message, text in zip(messages, decrypted):
+        assert text.startswith(message)
+
+
+def test_key_store_generations_limit(tmp_path, capsys):
+    store = KeyStore(str(tmp_path))
+    for generations in [0, 2**16]:
+        with pytest.raises(ValueError):
+            store.save("password", generations)
+    assert list(tmp_path.iterdir()) == []
+
+    with pytest.raises(SystemExit):
+        key_store_main([str(tmp_path), "-p", "password", "-g", "70000"])
+    assert "--generations must be between 1 and 65535" in capsys.readouterr().err
+
+
+def reference_iter_symbols(source):
+    """
+    The per-character tokenizer split_symbols() replaced, kept as the
+    reference it has to match.
+    """
+    leftover = ""  # The start of a possible NULL_STRING from the last chunk
+
+    for chunk in encode_v2.iter_chunks(source):
+        string = leftover + chunk
+        leftover = ""
+        skipped_loop = 0  # For handling the \\x00 character
+
+        for index, step in enumerate(string):
+            # If a NULL_STRING is found, skip over the individual characters
+            # until the next valid character is reached
+            if skipped_loop > 0:
+                skipped_loop -= 1
+                continue
+
+            if step == chr(92):  # The \ character
+                # Check if the \ symbol is part of the NULL_STRING
+                if string[index : (index + 4)] == NULL_STRING:
+                    yield NULL_STRING
+                    # Sets number of loops to skip based on NULL_STRING length
+                    skipped_loop = len(NULL_STRING) - 1
+                # The chunk ran out before the NULL_STRING could be checked
+                elif NULL_STRING.startswith(string[index:]):
+                    leftover = string[index:]
+                    break
+                else:
+                    yield step  # Only the \ character was found
+
+            else:
+                # Otherwise, just give back the found character
+                yield step
+
+    # Nothing else is coming, so these were just normal characters
+    yield from leftover
+
+
+def test_tokenizer_matches_per_character_loop():
+    random_generator = random.Random(13)
+    chunk_size = encode_v2.STREAM_CHUNK_SIZE
+    pieces = ["a", "\\", "\\x", "\\x0", NULL_STRING, "\\\\x00", "x", "0", chr(0)]
+    strings = [
+        "",
+        "\\\\x00",
+        "ends with \\x0",
+        "ends with \\",
+        "ends with \\x",
+        NULL_STRING * 5 + "\\\\x00\\",
+        # A NULL_STRING across each STREAM_CHUNK_SIZE piece of a long chunk
+        "a" * (chunk_size - 2) + NULL_STRING + "b" * (chunk_size - 1) + "\\x00",
+    ]
+    strings += [
+        "".join(random_generator.choice(pieces) for _ in range(length))
+        for length in [10, 100, 3000]
+    ]
+
+    for string in strings:
+        expected = list(reference_iter_symbols(string))
+        symbols, leftover = encode_v2.split_symbols(string)
+        assert symbols + list(leftover) == expected
+        assert list(encode_v2.iter_symbols(string)) == expected
+        for block_size in [1, 5, 32]:
+            blocks = list(encode_v2.iter_symbol_blocks(string, block_size))
+            assert list(chain.from_iterable(blocks)) == expected
+            assert all(len(block) == block_size for block in blocks[:-1])
+
+        # The same text split into chunks at random places
+        for _ in range(5):
+            cuts = sorted(random_generator.randint(0, len(string)) for _ in range(6))
+            chunks = [string[x:y] for x, y in zip([0] + cuts, cuts + [len(string)])]
+            assert list(reference_iter_symbols(chunks)) == expected
+            assert list(encode_v2.iter_symbols(chunks)) == expected
+            blocks = encode_v2.iter_symbol_blocks(chunks, 7)
+            assert list(chain.from_iterable(blocks)) == expected
+
+        with encode_v2.instrument() as metrics:
+            list(encode_v2.iter_symbols(string))
+        hits = metrics.counters.get("null_string_hits", 0)
+        assert hits == expected.count(NULL_STRING)